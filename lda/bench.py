@@ -0,0 +1,65 @@
+import argparse
+import sys, os
+import subprocess
+import tempfile
+import shutil
+import time
+
+# times LDA-C against our own engines on the same data, settings, and K.
+# each engine writes its model into a scratch directory, which we throw
+# away afterwards; we report wall-clock time, the number of EM
+# iterations, the time per iteration, and the final likelihood.
+
+def commands(engine, alpha, k, settings, data, d, lda):
+    if engine == 'lda':
+        return [lda, 'est', alpha, str(k), settings, data, 'seeded', d]
+    return [sys.executable, engine + '.py', 'est', alpha, str(k), settings, data, 'seeded', d]
+
+def likelihoods(d):
+    return [float(line.split()[0]) for line in open(os.path.join(d, "likelihood.dat"))]
+
+def bench(engine, alpha, k, settings, data, lda):
+    scratch = tempfile.mkdtemp(prefix="bench-%s-" % engine)
+    d = os.path.join(scratch, "lda%d" % k)
+
+    devnull = open(os.devnull, "w")
+    began = time.time()
+    try:
+        status = subprocess.call(commands(engine, alpha, k, settings, data, d, lda), stdout=devnull)
+    except OSError:
+        # e.g., LDA-C isn't installed
+        status = None
+    elapsed = time.time() - began
+    devnull.close()
+
+    try:
+        if status != 0:
+            return None
+        l = likelihoods(d)
+        return (elapsed, len(l), l[-1])
+    finally:
+        shutil.rmtree(scratch)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "time LDA-C against vem.py on the same corpus")
+    parser.add_argument('data', help = "an LDA-C data file, e.g. PFX/abstracts.dat")
+    parser.add_argument('k', type = int, nargs = '+', help = "numbers of topics to try")
+    parser.add_argument('--alpha', default = '1/50')
+    parser.add_argument('--settings', default = 'settings.txt')
+    parser.add_argument('--engines', default = 'lda,vem',
+                        help = "comma-separated engines to time (default: lda,vem)")
+    parser.add_argument('--lda', default = 'lda', help = "the LDA-C binary")
+    args = parser.parse_args()
+
+    print "%-6s %5s %10s %6s %10s %18s" % ("engine", "K", "seconds", "iters", "s/iter", "likelihood")
+    for k in args.k:
+        for engine in args.engines.split(','):
+            result = bench(engine, args.alpha, k, args.settings, args.data, args.lda)
+            if result is None:
+                print "%-6s %5d failed" % (engine, k)
+                continue
+
+            (elapsed, iters, likelihood) = result
+            print "%-6s %5d %10.1f %6d %10.2f %18.4f" % \
+                (engine, k, elapsed, iters, elapsed / iters, likelihood)
@@ -1,76 +1,90 @@
 import codecs
-import re
 import sys
-from operator import add
 
-def quote(s):
-    return '"' + s + '"'
+import numpy as np
 
-title = re.compile(u'(.*) \((.*) (\\d*)\)$')
-def split_title(doc):
-    m = title.match(doc)
-    return [m.group(3),m.group(2),quote(m.group(1))]
+import model
+import chunks
 
+# each conference-year's number of papers and total topic weights, added
+# up a block of papers at a time (see chunks.py), in the order of the
+# papers. every paper's year and conference, as numbers, come from the
+# run's table (see metadata.py), and each conference-year is a group
+class Sums(object):
+    def __init__(self, m):
+        self.m = m
+        self.table = table = m.run.table
+        (self.Y, self.C) = (len(table.year_names), len(table.conf_names))
+        self.groups = np.asarray(table.years, dtype=np.int64) * self.C + table.confs
+        self.counts = np.bincount(self.groups, minlength=self.Y * self.C)
+        self.totals = None
 
-def run(docs,gammas,normalize=True):
-    # show the header
-    num_topics = len(gamma[0].split())
+    def add(self, start, docs, gamma):
+        if self.totals is None:
+            self.totals = np.zeros((self.Y * self.C, gamma.shape[1]))
+        np.add.at(self.totals, self.groups[start:start + len(gamma)], gamma)
 
-    # topics per document, collecting conference names
-    years = {}
-    all_years = set()
-    confs = set()
-    for d,g in zip(docs, gammas):
-        year,conf,title = split_title(d)
-        ts = map(float,g.split())
+# normalize: each conference-year's topics as the mean over its papers,
+# rather than the sum. proportions: as shares of the conference-year's
+# total topic weight, so that each adds up to 1
+def report(sums,normalize=True,proportions=False):
+    (table, C) = (sums.table, sums.C)
+    totals = sums.totals
+    if totals is None:
+        totals = np.zeros((sums.Y * C, sums.m.num_topics))
+    num_topics = totals.shape[1]
 
-        if year not in years:
-            years[year] = {}
-
-        confs.add(conf)
-        if conf not in years[year]:
-            years[year][conf] = [1] + ts
-        else:
-            years[year][conf] = map(add, [1] + ts, years[year][conf])
+    # conference-years with no papers aren't printed; we fill them in
+    # so as not to divide by zero
+    present = sums.counts > 0
+    (counts, totals) = (sums.counts.copy(), totals.copy())
+    totals[~present] = 1
+    counts[~present] = 1
+    if proportions:
+        totals /= totals.sum(axis=1)[:,np.newaxis]
+    elif normalize:
+        totals /= counts[:,np.newaxis].astype(np.float64)
+    counts = counts.tolist()
+    totals = totals.tolist()
 
     # fix a conference order
-    conf_order = list(confs)
-    conf_order.sort()
+    conf_order = sorted(range(C), key=lambda c: table.conf_names[c])
 
     # print out the header
     header = ["Year"]
-    for conf in conf_order:
+    for c in conf_order:
+        conf = table.conf_names[c]
         header += [conf + " # of papers"] + [conf + " Topic " + str(i) for i in range(0,num_topics)]
     print ','.join(header)
 
-    # print out the topics
-    for year in years:
+    # print out the topics, in the order of a dict of the years
+    order = {}
+    for y,year in enumerate(table.year_names):
+        order[year] = y
+    for year in order:
+        y = order[year]
         tvals = []
-        for conf in conf_order:
-            if conf in years[year]:
-                if normalize:
-                    ts = years[year][conf]
-                    num_papers = ts[0]
-
-                    for i in range(1,len(ts)):
-                        ts[i] = ts[i] / float(num_papers)
-
-                    tvals += ts
-                else:
-                    tvals += years[year][conf]
+        for c in conf_order:
+            g = y * C + c
+            if present[g]:
+                tvals += [counts[g]] + totals[g]
             else:
                 tvals += [0] + ["" for i in range(0,num_topics)]
 
         print ','.join([year] + map(str,tvals))
-        
 
-def read(f, enc="utf8"):
-    return map(lambda s: s.strip(),codecs.open(f,"r",enc).readlines())
+def run(m,normalize=True,proportions=False):
+    sums = Sums(m)
+    for block in chunks.numbered(chunks.gamma_blocks(m)):
+        sums.add(*block)
+    report(sums, normalize, proportions)
+        
 
 if (__name__ == '__main__'):
     args = dict(enumerate(sys.argv))
-    gamma = read(args.get(1,"final.gamma"))
-    docs = read(args.get(2,"../docs.dat"))
+    gamma = args.get(1,"final.gamma")
+    docs = args.get(2,"../docs.dat")
     nflag = args.get(3,"--normalize")
     
-    run(docs, gamma, normalize=(nflag == "--normalize"))
+    run(model.from_files(gamma,docs), normalize=(nflag == "--normalize"),
+        proportions=(nflag == "--proportions"))
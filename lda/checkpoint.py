@@ -0,0 +1,72 @@
+import os
+import json
+import tempfile
+
+# how far a training run has got, so that a run that's killed can pick up
+# where it left off rather than start over. each engine saves its model
+# every so often, and then records what it needs to carry on from there
+# in DIR/checkpoint.json.
+
+def checkpoint_file(d):
+    return os.path.join(d, "checkpoint.json")
+
+def save(d, **state):
+    fd,tmp = tempfile.mkstemp(dir=d)
+    out = os.fdopen(fd,"w")
+    json.dump(state, out, indent=1, sort_keys=True)
+    out.close()
+    os.rename(tmp, checkpoint_file(d))
+
+def load(d):
+    if not os.path.exists(checkpoint_file(d)):
+        return None
+    return json.load(open(checkpoint_file(d)))
+
+# forget the likelihoods of iterations after the checkpoint, since we're
+# about to do them again
+def truncate_likelihoods(d, n):
+    f = os.path.join(d, "likelihood.dat")
+    lines = open(f).readlines()[:n] if os.path.exists(f) else []
+
+    out = open(f, "w")
+    out.writelines(lines)
+    out.close()
+
+# whatever whole lines have been added to a file since pos, and where to
+# look next time
+def read_lines(f, pos):
+    if not os.path.exists(f):
+        return ("", pos)
+
+    log = open(f)
+    log.seek(pos)
+    text = log.read()
+    log.close()
+
+    text = text[:text.rfind("\n") + 1]
+    return (text, pos + len(text))
+
+# asking a run to stop early, e.g. because it has stopped getting
+# better: engines look for DIR/stop between iterations, and finish up as
+# if they had converged. they remove it when they start, and once
+# they've stopped, so a retry or a resume isn't stopped as well
+def stop_file(d):
+    return os.path.join(d, "stop")
+
+def request_stop(d, reason):
+    out = open(stop_file(d), "w")
+    out.write(reason + "\n")
+    out.close()
+
+def stop_requested(d):
+    return os.path.exists(stop_file(d))
+
+def clear_stop(d):
+    if os.path.exists(stop_file(d)):
+        os.remove(stop_file(d))
+
+# why we were asked to stop; we only act on it once
+def take_stop(d):
+    reason = open(stop_file(d)).read().strip()
+    clear_stop(d)
+    return reason
@@ -0,0 +1,159 @@
+import sys, os
+import codecs
+import heapq
+import itertools
+
+import numpy as np
+
+import store
+import index
+
+# a model's papers a block of rows at a time (their docs.dat lines and
+# their rows of final.gamma, together), so the reports work on runs too
+# big to have all of in memory at once:
+#
+#   for (start, docs, gamma) in chunks.chunks(m):
+#       ...
+#
+# docs is a list of lines of docs.dat, and gamma a float64 array with a
+# row for each. the binary copy of gamma is read a slice at a time (see
+# store.py), and the text, and docs.dat, a line at a time. anything the
+# model already has in memory is used as it is.
+
+CHUNK = 10000
+
+def gamma_blocks(m, size=CHUNK):
+    f = m.prefix + ".gamma"
+    if 'gamma' in m.__dict__ or store.fresh(f):
+        gamma = m.gamma if 'gamma' in m.__dict__ else np.load(store.binary_file(f), mmap_mode='r')
+        for start in xrange(0, gamma.shape[0], size):
+            yield np.asarray(gamma[start:start + size], dtype=np.float64)
+        return
+
+    lines = (line for line in open(f) if line.strip())
+    while True:
+        block = [np.fromstring(line, dtype=np.float64, sep=' ')
+                 for line in itertools.islice(lines, size)]
+        if not block:
+            return
+        yield np.vstack(block)
+
+def doc_blocks(run, size=CHUNK):
+    if 'docs' in run.__dict__:
+        for start in xrange(0, len(run.docs), size):
+            yield run.docs[start:start + size]
+        return
+
+    lines = (line.strip() for line in codecs.open(run.docs_file, "r", "utf8"))
+    while True:
+        block = list(itertools.islice(lines, size))
+        if not block:
+            return
+        yield block
+
+def chunks(m, size=CHUNK):
+    start = 0
+    for (docs, gamma) in itertools.izip(doc_blocks(m.run, size), gamma_blocks(m, size)):
+        yield (start, docs, gamma)
+        start += len(gamma)
+
+# the same blocks with a start, but without reading docs.dat
+def numbered(blocks):
+    start = 0
+    for gamma in blocks:
+        yield (start, None, gamma)
+        start += len(gamma)
+
+# what the reports work out from the papers, each fed every block in
+# turn (add(start, docs, gamma)), so that postprocess.py can make all of
+# them from one pass over gamma and docs.dat
+
+# just the docs.dat lines of the given papers, by id
+class Pick(object):
+    def __init__(self, ids):
+        self.wanted = set(ids)
+        self.docs = {}
+
+    def add(self, start, docs, gamma):
+        for p in self.wanted.intersection(xrange(start, start + len(docs))):
+            self.docs[p] = docs[p - start]
+
+# each topic's total weight, added up a paper at a time, in order
+class Totals(object):
+    def __init__(self):
+        self.total = None
+
+    def add(self, start, docs, gamma):
+        if self.total is None:
+            self.total = np.zeros(gamma.shape[1])
+        self.total = np.vstack([self.total[np.newaxis,:], gamma]).sum(axis=0)
+
+# the ids and weights of each topic's top n papers, biggest first, ties
+# in order of id, as index.top would give them from the whole of gamma;
+# we keep the best n so far of each topic in a heap. rows, if given, is
+# a bool for every paper (see metadata.py), and only those that are True
+# are counted. when given docs, we also keep the docs.dat lines of the papers
+# in the heaps
+class TopPapers(object):
+    def __init__(self, n, rows=None):
+        self.n = n
+        self.rows = rows
+        self.heaps = None
+        self.seen = 0
+        self.docs = {}
+
+    def add(self, start, docs, gamma):
+        (n, heaps) = (self.n, self.heaps)
+        if heaps is None:
+            heaps = self.heaps = [[] for t in range(gamma.shape[1])]
+        if self.rows is None:
+            ids = np.arange(len(gamma))
+        else:
+            ids = np.flatnonzero(self.rows[start:start + len(gamma)])
+        for t in range(gamma.shape[1]):
+            heap = heaps[t]
+            for p in ids[index.top(gamma[ids,t], n)]:
+                # the least weight (and, of those, the latest paper) goes first
+                item = (gamma[p,t], -(start + p))
+                if len(heap) < n:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        self.seen += len(ids)
+
+        if docs is not None:
+            kept = set(-p for heap in heaps for (w, p) in heap)
+            for p in kept.intersection(xrange(start, start + len(docs))):
+                self.docs[p] = docs[p - start]
+            for p in set(self.docs) - kept:
+                del self.docs[p]
+
+    def result(self):
+        heaps = self.heaps or []
+        ids = np.zeros((len(heaps), min(self.n, self.seen)), dtype=np.int32)
+        weights = np.zeros((len(heaps), min(self.n, self.seen)))
+        for (t, heap) in enumerate(heaps):
+            best = sorted(heap, reverse=True)
+            ids[t] = [-p for (w, p) in best]
+            weights[t] = [w for (w, p) in best]
+        return (ids, weights)
+
+def pick_docs(run, ids, size=CHUNK):
+    pick = Pick(ids)
+    start = 0
+    for docs in doc_blocks(run, size):
+        pick.add(start, docs, None)
+        start += len(docs)
+    return pick.docs
+
+def totals(m, size=CHUNK):
+    totals = Totals()
+    for block in numbered(gamma_blocks(m, size)):
+        totals.add(*block)
+    return totals.total
+
+def top_papers(m, n, size=CHUNK, rows=None):
+    top = TopPapers(n, rows)
+    for block in numbered(gamma_blocks(m, size)):
+        top.add(*block)
+    return top.result()
@@ -1,5 +1,9 @@
 import sys
+
+import numpy as np
+
 from utils import *
+import model
 
 def to_float(s):
     if s == '':
@@ -8,16 +12,14 @@ def to_float(s):
         return float(s)
 
 def read_model(d, k):
-    pfx = "%s_lda%d" % (d,k)
-    
-    betas = floats(read(os.path.join(pfx,"final.beta")))
-    gammas = floats(read(os.path.join(pfx,"final.gamma")))
-    docs = zip(read(d + "_docs.dat"), gammas)
-    
-    return (betas,docs)
+    m = model.open_model(d, k)
+    return (m.beta,(m.docs,m.gamma))
 
-def cmp_on(i):
-    return lambda p1,p2: -cmp(p1[1][i],p2[1][i])
+# the titles of the num papers with the most of topic i
+def top_on(docs, i, num):
+    (titles, gammas) = docs
+    weights = np.asarray(gammas[:,i], dtype=np.float64)
+    return [titles[p] for p in np.argsort(-weights, kind='mergesort')[:num]]
 
 if (__name__ == '__main__'):
     args = dict(enumerate(sys.argv))
@@ -36,18 +38,9 @@ if (__name__ == '__main__'):
     counts = []
     for (i, (b1, b2)) in enumerate(zip(betas1, betas2)):
 
-        # make copies
-        top1 = list(docs1)
-        top2 = list(docs2)
-
-        # sort by weight in topic i
-        compare = cmp_on(i)
-        top1.sort(compare)
-        top2.sort(compare)
-
-        # get the top N of them
-        top1 = [d[0] for d in top1[:num]]
-        top2 = [d[0] for d in top2[:num]]
+        # the top N of them, by weight in topic i
+        top1 = top_on(docs1, i, num)
+        top2 = top_on(docs2, i, num)
 
         # find the ones that are in common
         common = set([d for d in top1]).intersection([d for d in top2])
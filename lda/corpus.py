@@ -0,0 +1,227 @@
+import sys, os
+import struct
+
+import numpy as np
+
+# a binary form of abstracts.dat, in compressed sparse row layout: for a
+# corpus PFX,
+#
+#   PFX.terms    the word ids of every document, one after the other (int32)
+#   PFX.counts   the count of each of those words (int32)
+#   PFX.offsets  where each document starts in the other two, plus one
+#                last offset for the end of the corpus (int64)
+#
+# so document d's words are terms[offsets[d]:offsets[d+1]]. each file
+# starts with a 16 byte header: 'TMPL', the numpy dtype, and the number
+# of entries. everything is little-endian.
+
+magic = 'TMPL'
+header = struct.Struct('<4s4sq')
+suffixes = {'terms': '<i4', 'counts': '<i4', 'offsets': '<i8'}
+
+def write_header(f, dtype, n):
+    f.seek(0)
+    f.write(header.pack(magic, dtype, n))
+
+def read_array(f):
+    raw = open(f, "rb").read(header.size)
+    tag, dtype, n = header.unpack(raw)
+    if tag != magic:
+        raise ValueError("%s isn't a binary corpus file" % f)
+    if n == 0:
+        # there's nothing to map
+        return np.zeros(0, dtype=np.dtype(dtype.strip('\0')))
+
+    return np.memmap(f, dtype=np.dtype(dtype.strip('\0')), mode='r',
+                     offset=header.size, shape=(n,))
+
+def binary_files(prefix):
+    return dict((s, prefix + '.' + s) for s in suffixes)
+
+def has_binary(prefix):
+    return all(os.path.exists(f) for f in binary_files(prefix).values())
+
+class Corpus(object):
+    def __init__(self, terms, counts, offsets):
+        self.terms = terms
+        self.counts = counts
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # views into the corpus, not copies
+    def __getitem__(self, d):
+        start, end = self.offsets[d], self.offsets[d + 1]
+        return (self.terms[start:end], self.counts[start:end])
+
+    def __iter__(self):
+        for d in xrange(len(self)):
+            yield self[d]
+
+    # as LDA-C counts them: one more than the largest word id
+    def num_terms(self):
+        if len(self.terms) == 0:
+            return 0
+        return int(self.terms.max()) + 1
+
+    # which document each entry of terms and counts belongs to
+    def doc_ids(self):
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def lengths(self):
+        return np.bincount(self.doc_ids(), weights=self.counts,
+                           minlength=len(self)).astype(np.int64)
+
+class CorpusWriter(object):
+    def __init__(self, prefix):
+        files = binary_files(prefix)
+        self.files = dict((s, open(files[s], "wb")) for s in suffixes)
+        for s in suffixes:
+            write_header(self.files[s], suffixes[s], 0)
+
+        self.nnz = 0
+        self.docs = 0
+        np.array([0], dtype='<i8').tofile(self.files['offsets'])
+
+    # words are kept in the order given, so they match abstracts.dat
+    def add(self, terms, counts):
+        n = len(terms)
+        np.asarray(terms, dtype='<i4').tofile(self.files['terms'])
+        np.asarray(counts, dtype='<i4').tofile(self.files['counts'])
+
+        self.nnz += n
+        self.docs += 1
+        np.array([self.nnz], dtype='<i8').tofile(self.files['offsets'])
+
+    def close(self):
+        sizes = {'terms': self.nnz, 'counts': self.nnz, 'offsets': self.docs + 1}
+        for s in suffixes:
+            write_header(self.files[s], suffixes[s], sizes[s])
+            self.files[s].close()
+
+def read_binary(prefix):
+    files = binary_files(prefix)
+    return Corpus(read_array(files['terms']),
+                  read_array(files['counts']),
+                  read_array(files['offsets']))
+
+def from_lines(lines):
+    terms = []
+    counts = []
+    offsets = [0]
+
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+
+        pairs = np.array(' '.join(fields[1:]).replace(':', ' ').split(), dtype=np.int64)
+        terms.append(pairs[0::2])
+        counts.append(pairs[1::2])
+        offsets.append(offsets[-1] + len(pairs) / 2)
+
+    if not terms:
+        return Corpus(np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(1, np.int64))
+
+    return Corpus(np.concatenate(terms).astype(np.int32),
+                  np.concatenate(counts).astype(np.int32),
+                  np.array(offsets, dtype=np.int64))
+
+def read_dat(f):
+    return from_lines(open(f))
+
+# the binary form of an LDA-C data file, if it's sitting next to it
+def binary_prefix(f):
+    (prefix,ext) = os.path.splitext(f)
+    if ext != '.dat' and has_binary(f):
+        return f
+    if ext == '.dat' and has_binary(prefix):
+        return prefix
+    return None
+
+def load(f):
+    prefix = binary_prefix(f)
+    if prefix is not None:
+        return read_binary(prefix)
+    return read_dat(f)
+
+# the documents of a corpus, size at a time, without ever reading all of
+# it into memory
+def chunks(f, size, skip=0):
+    if binary_prefix(f) is not None:
+        corpus = load(f)
+        for start in xrange(skip, len(corpus), size):
+            end = min(start + size, len(corpus))
+            (lo,hi) = corpus.offsets[start], corpus.offsets[end]
+            yield Corpus(corpus.terms[lo:hi], corpus.counts[lo:hi],
+                         corpus.offsets[start:end+1] - lo)
+        return
+
+    lines = []
+    for line in open(f):
+        if not line.strip():
+            continue
+        if skip > 0:
+            skip -= 1
+            continue
+
+        lines.append(line)
+        if len(lines) == size:
+            yield from_lines(lines)
+            lines = []
+
+    if lines:
+        yield from_lines(lines)
+
+# without reading it all, either
+def count_docs(f):
+    if binary_prefix(f) is not None:
+        return len(load(f))
+    return sum(1 for line in open(f) if line.strip())
+
+def count_terms(f):
+    return max([c.num_terms() for c in chunks(f, 4096)] + [0])
+
+def write_binary(corpus, prefix):
+    files = binary_files(prefix)
+    for s in suffixes:
+        a = np.asarray(getattr(corpus, s), dtype=suffixes[s])
+
+        out = open(files[s], "wb")
+        write_header(out, suffixes[s], len(a))
+        a.tofile(out)
+        out.close()
+
+def to_binary(dat_file, prefix):
+    write_binary(read_dat(dat_file), prefix)
+
+def to_dat(prefix, dat_file):
+    corpus = read_binary(prefix)
+
+    out = open(dat_file, "w")
+    for (terms,counts) in corpus:
+        out.write(str(len(terms)))
+        out.write(' ')
+        for (term,count) in zip(terms.tolist(), counts.tolist()):
+            out.write(str(term))
+            out.write(':')
+            out.write(str(count))
+            out.write(' ')
+        out.write('\n')
+    out.close()
+
+if (__name__ == '__main__'):
+    args = dict(enumerate(sys.argv))
+    mode = args.get(1)
+
+    if mode == "to-binary":
+        dat_file = args.get(2, "abstracts.dat")
+        to_binary(dat_file, args.get(3, os.path.splitext(dat_file)[0]))
+    elif mode == "to-dat":
+        prefix = args.get(2, "abstracts")
+        to_dat(prefix, args.get(3, prefix + ".dat"))
+    else:
+        print 'usage: python corpus.py to-binary [abstracts.dat] [prefix]'
+        print '       python corpus.py to-dat [prefix] [abstracts.dat]'
+        sys.exit(1)
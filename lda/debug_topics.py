@@ -2,52 +2,43 @@ import codecs
 import re
 import sys,os
 
-def mean(l):
-    return sum(l) / float(len(l))
-
-def run(docs,betas,gammas,vocab,num):
-    papers = zip(docs,map(lambda s: map(float,s.split()), gammas))
-
-    num_topics = len(betas)    
-    for i,raw_betas in enumerate(betas):
+import model
+import chunks
+
+# docs, if given, has the docs.dat lines of (at least) the papers shown
+def run(m,num,docs=None):
+    vocab = m.vocab
+
+    # the top words and papers come from the model's index (see
+    # index.py), and we only need the titles of those papers
+    m.ensure_index(num)
+    num_topics = len(m.index.words)
+    if docs is None:
+        docs = chunks.pick_docs(m.run, m.index.papers[:,:num].ravel().tolist())
+    for i in range(num_topics):
         print 'Topic %03d' % i
         print '---------'
 
-        bs = map(float, raw_betas.split())
-        print 'Words (mean weight: %f, min weight: %f)' % (mean(bs),min(bs))
-
-        words = range(len(bs))
-        words.sort(lambda x,y: -cmp(bs[x],bs[y]))
+        print 'Words (mean weight: %f, min weight: %f)' % (m.index.word_means[i],m.index.word_mins[i])
 
-        for word in words[:num]:
-            print '  %s (%f)' % (vocab[word], bs[word])
+        for (word,weight) in zip(*m.top_words(i, num)):
+            print '  %s (%f)' % (vocab[word], weight)
 
         print '---------'
         print 'Papers'
 
-        papers.sort(lambda p1,p2: -cmp(p1[1][i],p2[1][i]))
-
         # topics per document
-        for p in papers[:num]:
-            print p[0]
-            print "  %f" % p[1][i]
+        for (p,weight) in zip(*m.top_papers(i, num)):
+            print docs[int(p)]
+            print "  %f" % weight
 
         if i + 1 != num_topics:
             print "\n"
 
-def read(f, enc="utf8"):
-    return map(lambda s: s.strip(),codecs.open(f,"r",enc).readlines())
-
 if (__name__ == '__main__'):
     args = dict(enumerate(sys.argv))
     d = args.get(1,"2015-01-05_23:21")
-    k = args.get(2,"200")
+    k = int(args.get(2,200))
     num = int(args.get(3,10))
-    
-    lda = os.path.join(d, "lda" + k)
-    beta = read(os.path.join(lda,"final.beta"))
-    gamma = read(os.path.join(lda,"final.gamma"))
-    docs = read(os.path.join(d, "docs.dat"))
-    vocab = read(os.path.join(d, "vocab.dat"))
-
-    run(docs,beta,gamma,vocab,num)
+
+    run(model.open_model(d,k),num)
@@ -0,0 +1,109 @@
+import zlib
+
+import numpy as np
+
+# near-duplicate detection with MinHash and locality-sensitive hashing.
+#
+# each document is summarized by a signature: for each of num_perm random
+# hash functions, the smallest hash of any of the document's shingles
+# (runs of k consecutive tokens). two documents agree on a given entry of
+# their signatures with probability equal to the Jaccard similarity of
+# their shingle sets.
+#
+# rather than compare every pair of signatures, we cut them into bands
+# and only compare documents that agree on every entry of some band.
+#
+# a document can have a few signatures, a tuple of them, one for each way
+# of looking at it (e.g., parse.py's: all of its text, and just its
+# abstract, so a paper's fulltext and a copy of just its abstract look
+# alike), any of which may be None. documents are near-duplicates if
+# they're alike in any one way.
+
+num_perm = 128
+shingle_size = 3
+
+prime = (1 << 31) - 1
+perms = np.random.RandomState(4357).randint(1, prime, size=(2, num_perm)).astype(np.int64)
+
+def shingles(tokens, k=shingle_size):
+    if len(tokens) < k:
+        k = len(tokens)
+
+    return set(zlib.crc32(u' '.join(tokens[i:i+k]).encode("utf8")) & prime
+               for i in xrange(len(tokens) - k + 1))
+
+# None for documents without any tokens, which we never call duplicates
+def signature(tokens):
+    hs = np.fromiter(shingles(tokens), np.int64)
+    if len(hs) == 0:
+        return None
+
+    a, b = perms
+    return ((np.outer(a, hs) + b[:,None]) % prime).min(axis=1)
+
+def similarity(s1, s2):
+    return np.mean(s1 == s2)
+
+def views(sigs):
+    return sigs if isinstance(sigs, tuple) else (sigs,)
+
+# of documents with several signatures, the most alike they are any one way
+def best_similarity(sigs1, sigs2):
+    return max([similarity(s1, s2) for (s1, s2) in zip(views(sigs1), views(sigs2))
+                if s1 is not None and s2 is not None] or [0.0])
+
+# bands of r rows are candidates with probability 1 - (1 - s^r)^b at
+# similarity s; this is steepest around (1/b)^(1/r), which we want a bit
+# below the threshold, so we miss few real duplicates. thresholds below
+# even the lowest knee (one row per band) get one row per band
+def choose_bands(threshold, n=num_perm):
+    best = None
+    for r in range(1, n + 1):
+        if n % r != 0:
+            continue
+
+        b = n / r
+        knee = (1.0 / b) ** (1.0 / r)
+        if knee <= threshold and (best is None or knee > best[0]):
+            best = (knee, b, r)
+
+    if best is None:
+        return (n, 1)
+    return best[1:]
+
+def find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+# groups of (indices of) documents that are near-duplicates of each other:
+# each one has similarity at least threshold with some other in its group
+def find_duplicates(signatures, threshold):
+    (b,r) = choose_bands(threshold)
+
+    buckets = {}
+    for (i,sigs) in enumerate(signatures):
+        for (v,sig) in enumerate(views(sigs)):
+            if sig is None:
+                continue
+
+            for band in range(b):
+                key = (v, band, sig[band*r:(band+1)*r].tostring())
+                buckets.setdefault(key, []).append(i)
+
+    parents = range(len(signatures))
+    for bucket in buckets.itervalues():
+        for (n,j) in enumerate(bucket):
+            for i in bucket[:n]:
+                if find(parents, i) == find(parents, j):
+                    continue
+
+                if best_similarity(signatures[i], signatures[j]) >= threshold:
+                    parents[find(parents, j)] = find(parents, i)
+
+    groups = {}
+    for i in range(len(signatures)):
+        groups.setdefault(find(parents, i), []).append(i)
+
+    return sorted(g for g in groups.itervalues() if len(g) > 1)
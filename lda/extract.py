@@ -0,0 +1,141 @@
+import argparse
+import sys, os
+import json
+import hashlib
+import tempfile
+import multiprocessing
+
+from utils import pdf_to_text
+
+# extracts the text of every PDF under a directory into a -fulltext.txt
+# file next to it (PFX.pdf becomes PFX-fulltext.txt), which is where
+# parse.py looks for fulltext.
+#
+# we remember the mtime, size, and hash of every PDF we've handled in a
+# cache file, so reruns only extract new or changed PDFs. PDFs that
+# pdftotext can't read are remembered too, and skipped unless asked.
+
+def fulltext_file(pdf):
+    (base,_) = os.path.splitext(pdf)
+    return base + "-fulltext.txt"
+
+def find_pdfs(d):
+    pdfs = []
+    for (root,dirs,files) in os.walk(d):
+        dirs.sort()
+        for f in sorted(files):
+            if f.lower().endswith(".pdf"):
+                pdfs.append(os.path.join(root,f))
+    return pdfs
+
+def sha1(f):
+    h = hashlib.sha1()
+    with open(f,"rb") as pdf:
+        for block in iter(lambda: pdf.read(1 << 20), ''):
+            h.update(block)
+    return h.hexdigest()
+
+def write_atomically(f, text):
+    fd,tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(f)))
+    out = os.fdopen(fd,"wb")
+    out.write(text)
+    out.close()
+    os.rename(tmp, f)
+
+def load_cache(f):
+    if not os.path.exists(f):
+        return {}
+    return json.load(open(f))
+
+def save_cache(f, cache):
+    write_atomically(f, json.dumps(cache, indent=1, sort_keys=True))
+
+# is the cached entry still good, judging only by the file's metadata?
+def unchanged(entry, st):
+    return (entry is not None and
+            entry['mtime'] == st.st_mtime and entry['size'] == st.st_size)
+
+def extract(job):
+    (pdf,entry,timeout,retry) = job
+
+    st = os.stat(pdf)
+    digest = sha1(pdf)
+    new = {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': digest, 'failed': False}
+
+    # touched, but not changed
+    if entry is not None and entry['sha1'] == digest and \
+       (os.path.exists(fulltext_file(pdf)) or (entry['failed'] and not retry)):
+        new['failed'] = entry['failed']
+        return (pdf,new,"unchanged")
+
+    text = pdf_to_text(pdf, timeout)
+    if text is None:
+        new['failed'] = True
+        return (pdf,new,"failed")
+
+    write_atomically(fulltext_file(pdf), text)
+    return (pdf,new,"extracted")
+
+def run(d, cache_file, jobs=1, timeout=120, retry=False):
+    cache = load_cache(cache_file)
+
+    pending = []
+    skipped = 0
+    for pdf in find_pdfs(d):
+        key = os.path.relpath(pdf, d)
+        entry = cache.get(key)
+
+        if unchanged(entry, os.stat(pdf)) and \
+           (os.path.exists(fulltext_file(pdf)) or (entry['failed'] and not retry)):
+            skipped += 1
+            continue
+
+        pending.append((pdf,entry,timeout,retry))
+
+    print "Extracting %d PDFs (%d are up to date)" % (len(pending), skipped)
+
+    if jobs == 1:
+        results = (extract(job) for job in pending)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(extract, pending)
+        pool.close()
+
+    tally = {"extracted": 0, "unchanged": 0, "failed": 0}
+    for (i,(pdf,entry,status)) in enumerate(results):
+        cache[os.path.relpath(pdf, d)] = entry
+        tally[status] += 1
+
+        if status == "failed":
+            print "Couldn't extract text from " + pdf
+
+        # don't lose everything if we're interrupted
+        if (i + 1) % 100 == 0:
+            save_cache(cache_file, cache)
+            print "%d/%d" % (i + 1, len(pending))
+
+    save_cache(cache_file, cache)
+    print "Extracted %(extracted)d, %(unchanged)d unchanged, %(failed)d failed" % tally
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = "extract the text of the PDFs in a directory")
+    parser.add_argument(
+        'directory', help = "directory to look for PDFs in")
+    parser.add_argument(
+        '-j', '--jobs', type = int, default = 1,
+        help = "number of PDFs to extract at once (0 means one per core)")
+    parser.add_argument(
+        '--timeout', type = int, default = 120, metavar = "SECONDS",
+        help = "give up on a PDF after this long")
+    parser.add_argument(
+        '--cache', metavar = "FILE",
+        help = "where to remember what we've extracted (default: DIRECTORY/.extract-cache.json)")
+    parser.add_argument(
+        '--retry', action = 'store_true',
+        help = "try PDFs that failed before again")
+    args = parser.parse_args()
+
+    cache_file = args.cache or os.path.join(args.directory, ".extract-cache.json")
+
+    run(args.directory, cache_file, args.jobs or multiprocessing.cpu_count(), args.timeout, args.retry)
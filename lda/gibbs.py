@@ -0,0 +1,274 @@
+import argparse
+import sys, os
+import random
+import time
+
+import numpy as np
+from scipy.special import gammaln
+
+import corpus
+import ldac
+import checkpoint
+
+# collapsed Gibbs sampling for LDA, with the sparse sampler of Yao, Mimno,
+# and McCallum (2009). the conditional for a token of word w in document d
+#
+#   p(z = t) ~ (alpha + n_td) (beta + n_wt) / (V beta + n_t)
+#
+# splits into three buckets:
+#
+#   s = sum_t alpha beta / (V beta + n_t)            (smoothing; every t)
+#   r = sum_t n_td beta / (V beta + n_t)             (the topics in d)
+#   q = sum_t (alpha + n_td) n_wt / (V beta + n_t)   (the topics of w)
+#
+# we keep s and r up to date as we go, so only q needs computing for each
+# token, and it only involves the few topics w has been assigned to. most
+# of the mass is in q, so we rarely have to look at every topic. the cost
+# per token grows with the topics actually in use, not with K.
+#
+# it takes the same arguments as `lda est` and writes final.beta,
+# final.gamma, final.other, and likelihood.dat (the log joint probability
+# of the words and topic assignments) in LDA-C's formats. the sweep is
+# plain python, one token at a time, so for all its sparseness it only
+# samples 70-200k tokens a second: thousands of sweeps of a big
+# corpus take far longer than LDA-C or vem.py would. it's for trying
+# out sampling on smaller corpora, not for sweep.py.
+
+LAG = 10                # compute the likelihood every LAG sweeps
+CHECKPOINT = 50         # save the topic assignments every CHECKPOINT sweeps
+
+class Sampler(object):
+    def __init__(self, data, K, alpha, beta, rng):
+        self.K = K
+        self.V = data.num_terms()
+        self.alpha = alpha
+        self.beta = beta
+        self.rng = rng
+
+        # one entry per token, grouped by document
+        self.words = np.repeat(np.asarray(data.terms), np.asarray(data.counts))
+        self.docs = np.repeat(data.doc_ids(), np.asarray(data.counts))
+        self.offsets = np.concatenate([[0], np.cumsum(data.lengths())])
+
+    def assign(self, z):
+        K = self.K
+        self.z = list(z)
+
+        self.n_t = np.bincount(z, minlength=K).tolist()
+        self.n_wt = [{} for w in xrange(self.V)]
+        self.n_td = [{} for d in xrange(len(self.offsets) - 1)]
+        for (w,d,t) in zip(self.words.tolist(), self.docs.tolist(), self.z):
+            self.n_wt[w][t] = self.n_wt[w].get(t, 0) + 1
+            self.n_td[d][t] = self.n_td[d].get(t, 0) + 1
+
+    def sweep(self):
+        (K, alpha, beta) = (self.K, self.alpha, self.beta)
+        (z, n_t, n_wt) = (self.z, self.n_t, self.n_wt)
+        uniform = self.rng.random
+        words = self.words.tolist()
+        offsets = self.offsets.tolist()
+
+        denom = [self.V * beta + n for n in n_t]
+        coef = [alpha / dt for dt in denom]
+        s = sum(alpha * beta / dt for dt in denom)
+
+        for d in xrange(len(offsets) - 1):
+            n_td = self.n_td[d]
+            r = 0.0
+            for (t,n) in n_td.iteritems():
+                r += n * beta / denom[t]
+                coef[t] = (alpha + n) / denom[t]
+
+            for i in xrange(offsets[d], offsets[d+1]):
+                w = words[i]
+                n_w = n_wt[w]
+
+                # take the token out
+                t = z[i]
+                s -= alpha * beta / denom[t]
+                r -= n_td[t] * beta / denom[t]
+                n_t[t] -= 1
+                denom[t] -= 1
+                n_td[t] -= 1
+                n_w[t] -= 1
+                if n_td[t] == 0:
+                    del n_td[t]
+                if n_w[t] == 0:
+                    del n_w[t]
+                s += alpha * beta / denom[t]
+                r += n_td.get(t, 0) * beta / denom[t]
+                coef[t] = (alpha + n_td.get(t, 0)) / denom[t]
+
+                q = 0.0
+                for (t,n) in n_w.iteritems():
+                    q += coef[t] * n
+
+                # and put it back somewhere
+                u = uniform() * (s + r + q)
+                t = None
+                if u < q:
+                    for (t,n) in n_w.iteritems():
+                        u -= coef[t] * n
+                        if u <= 0:
+                            break
+                elif u < q + r:
+                    u -= q
+                    for (t,n) in n_td.iteritems():
+                        u -= n * beta / denom[t]
+                        if u <= 0:
+                            break
+                else:
+                    u -= q + r
+                    for t in xrange(K):
+                        u -= alpha * beta / denom[t]
+                        if u <= 0:
+                            break
+
+                z[i] = t
+                s -= alpha * beta / denom[t]
+                r -= n_td.get(t, 0) * beta / denom[t]
+                n_t[t] += 1
+                denom[t] += 1
+                n_td[t] = n_td.get(t, 0) + 1
+                n_w[t] = n_w.get(t, 0) + 1
+                s += alpha * beta / denom[t]
+                r += n_td[t] * beta / denom[t]
+                coef[t] = (alpha + n_td[t]) / denom[t]
+
+            for t in n_td:
+                coef[t] = alpha / denom[t]
+
+    def topic_word(self):
+        z = np.array(self.z)
+        return np.bincount(z * self.V + self.words,
+                           minlength=self.K * self.V).reshape(self.K, self.V)
+
+    def doc_topic(self):
+        z = np.array(self.z)
+        D = len(self.offsets) - 1
+        return np.bincount(self.docs * self.K + z,
+                           minlength=D * self.K).reshape(D, self.K)
+
+    # log p(w, z)
+    def likelihood(self):
+        (K, V, alpha, beta) = (self.K, self.V, self.alpha, self.beta)
+        (nw, nd) = (self.topic_word(), self.doc_topic())
+        D = nd.shape[0]
+
+        words = (K * (gammaln(V * beta) - V * gammaln(beta))
+                 + gammaln(nw + beta).sum() - gammaln(nw.sum(axis=1) + V * beta).sum())
+        topics = (D * (gammaln(K * alpha) - K * gammaln(alpha))
+                  + gammaln(nd + alpha).sum() - gammaln(nd.sum(axis=1) + K * alpha).sum())
+        return words + topics
+
+    def log_beta(self):
+        nw = self.topic_word() + self.beta
+        return np.log(nw) - np.log(nw.sum(axis=1))[:,np.newaxis]
+
+    # like LDA-C's gamma: the posterior Dirichlet for each document
+    def gamma(self):
+        return self.doc_topic() + self.alpha
+
+def initial_topics(sampler, start, rng):
+    if start in ("seeded", "random"):
+        return rng.randint(sampler.K, size=len(sampler.words))
+
+    # draw each token's topic from a saved model's p(topic | word)
+    (log_beta, _) = ldac.read_model(start)
+    p = np.exp(log_beta - log_beta.max(axis=0))[:,sampler.words]
+    cdf = np.cumsum(p / p.sum(axis=0), axis=0)
+    return np.minimum((cdf < rng.random_sample(len(sampler.words))).sum(axis=0),
+                      sampler.K - 1)
+
+def estimate(data, alpha, K, start, d, iterations, beta=0.01, seed=None, resume=False):
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    checkpoint.clear_stop(d)
+
+    rng = np.random.RandomState(seed)
+    sampler = Sampler(data, K, alpha, beta, random.Random(seed))
+    num_tokens = len(sampler.words)
+
+    saved = checkpoint.load(d) if resume else None
+    if saved is not None and saved['engine'] == 'gibbs':
+        first = saved['iteration'] + 1
+        likelihood_old = saved['likelihood']
+        sampler.assign(np.load(os.path.join(d, "checkpoint.z.npy")))
+
+        print "resuming from iteration %d" % saved['iteration']
+        lines = saved['lines']
+        checkpoint.truncate_likelihoods(d, lines)
+        likelihood_file = open(os.path.join(d, "likelihood.dat"), "a")
+    else:
+        first = 1
+        lines = 0
+        likelihood_old = 0.0
+        sampler.assign(initial_topics(sampler, start, rng))
+        likelihood_file = open(os.path.join(d, "likelihood.dat"), "w")
+
+    elapsed = 0.0
+    sweeps = 0
+    for i in xrange(first, iterations + 1):
+        began = time.time()
+        sampler.sweep()
+        took = time.time() - began
+        elapsed += took
+        sweeps += 1
+
+        if i % LAG == 0 or i == iterations:
+            likelihood = sampler.likelihood()
+            if likelihood_old == 0.0:
+                converged = float('inf')
+            else:
+                converged = (likelihood_old - likelihood) / likelihood_old
+            likelihood_old = likelihood
+
+            likelihood_file.write(ldac.likelihood_line(likelihood, converged))
+            likelihood_file.flush()
+            lines += 1
+            print "iteration %d: likelihood %f (%.0f tokens/sec)" % \
+                (i, likelihood, num_tokens / took)
+
+        if i % CHECKPOINT == 0:
+            np.save(os.path.join(d, "checkpoint.z.npy"), np.array(sampler.z, dtype=np.int32))
+            checkpoint.save(d, engine='gibbs', iteration=i, likelihood=likelihood_old, lines=lines)
+
+        if checkpoint.stop_requested(d):
+            print "stopping early: " + checkpoint.take_stop(d)
+            break
+
+    likelihood_file.close()
+
+    ldac.write_model(os.path.join(d, "final"), sampler.log_beta(), alpha)
+    ldac.write_gamma(os.path.join(d, "final.gamma"), sampler.gamma())
+
+    if sweeps > 0:
+        print "%d tokens, %d sweeps in %.1fs: %.0f tokens/sec" % \
+            (num_tokens, sweeps, elapsed, num_tokens * sweeps / elapsed)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "collapsed Gibbs sampling for LDA, compatible with LDA-C")
+    sub = parser.add_subparsers(dest = 'mode')
+
+    est = sub.add_parser('est', help = "estimate a model, like `lda est`")
+    est.add_argument('--iterations', type = int, default = 1000,
+                     help = "number of sweeps through the corpus (default: 1000)")
+    est.add_argument('--beta', type = float, default = 0.01,
+                     help = "Dirichlet prior on topics' words (default: 0.01)")
+    est.add_argument('--seed', type = int,
+                     help = "random seed (default: different every time)")
+    est.add_argument('--resume', action = 'store_true',
+                     help = "carry on from the last checkpoint in the directory, if there is one")
+    est.add_argument('alpha')
+    est.add_argument('k', type = int)
+    est.add_argument('settings', help = "ignored; for compatibility with `lda est`")
+    est.add_argument('data')
+    est.add_argument('start', help = "seeded, random, or a saved model (e.g. PFX/lda50/final)")
+    est.add_argument('directory')
+
+    args = parser.parse_args()
+
+    data = corpus.load(args.data)
+    estimate(data, ldac.atof(args.alpha), args.k, args.start, args.directory,
+             args.iterations, args.beta, args.seed, args.resume)
@@ -0,0 +1,143 @@
+import argparse
+import sys, os
+import tempfile
+
+import numpy as np
+
+import model
+import chunks
+
+# the top words and papers of every topic of a model, worked out once and
+# kept in PFX/ldaK/index.npz, so the reports (debug_topics.py,
+# top_papers.py, topics.py) don't have to sort every topic's words and
+# every paper again each time:
+#
+#   python index.py PFX [k1 ... kn]
+#
+# for each topic, it has the ids and weights of the top --size (default:
+# 100) words and papers, biggest first, and the mean and least weight of
+# its words. a model that has no index, or whose index is older than it
+# is, makes a new one the first time it's asked for its top words.
+
+SIZE = 100
+
+# the ids of the n largest entries of v, biggest first. ties come in
+# order of id, as they would from a stable sort of the whole thing
+def top(v, n):
+    v = np.asarray(v)
+    if 0 < n < len(v):
+        part = np.argpartition(v, len(v) - n)[len(v) - n:]
+        ids = np.flatnonzero(v >= v[part].min())
+    else:
+        ids = np.arange(len(v))
+    return ids[np.argsort(-v[ids], kind='mergesort')][:n]
+
+def index_file(m):
+    return m.path("index.npz")
+
+def sources(m):
+    fs = []
+    for ext in [".beta", ".gamma"]:
+        f = m.prefix + ext
+        fs.append(f if os.path.exists(f) else f + ".npy")
+    return fs
+
+def fresh(m):
+    f = index_file(m)
+    return os.path.exists(f) and \
+        all(os.path.getmtime(f) >= os.path.getmtime(s) for s in sources(m) if os.path.exists(s))
+
+class Index(object):
+    def __init__(self, arrays):
+        self.size = int(arrays['size'])
+        self.words = arrays['words']
+        self.word_weights = arrays['word_weights']
+        self.word_means = arrays['word_means']
+        self.word_mins = arrays['word_mins']
+        self.papers = arrays['papers']
+        self.paper_weights = arrays['paper_weights']
+
+# the papers come a block at a time (see chunks.py), so we never need
+# all of gamma at once; papers, if given, are their ids and weights, as
+# chunks.top_papers gives them
+def build(m, size=SIZE, papers=None):
+    beta = m.beta
+    K = beta.shape[0]
+    (papers, paper_weights) = papers or chunks.top_papers(m, size)
+
+    arrays = {'size': size,
+              'words': np.zeros((K, min(size, beta.shape[1])), dtype=np.int32),
+              'word_weights': np.zeros((K, min(size, beta.shape[1])), dtype=beta.dtype),
+              'word_means': np.zeros(K),
+              'word_mins': np.zeros(K),
+              'papers': papers,
+              'paper_weights': paper_weights}
+    for t in range(K):
+        bs = np.asarray(beta[t])
+        ws = top(bs, size)
+        arrays['words'][t] = ws
+        arrays['word_weights'][t] = bs[ws]
+        arrays['word_means'][t] = np.asarray(bs, dtype=np.float64).mean()
+        arrays['word_mins'][t] = bs.min()
+
+    return Index(arrays)
+
+def save(m, index):
+    fd,tmp = tempfile.mkstemp(dir=m.d)
+    out = os.fdopen(fd,"wb")
+    np.savez(out, size=index.size, words=index.words, word_weights=index.word_weights,
+             word_means=index.word_means, word_mins=index.word_mins,
+             papers=index.papers, paper_weights=index.paper_weights)
+    out.close()
+    os.rename(tmp, index_file(m))
+
+# the saved index, if it's up to date and big enough
+def cached(m, size=SIZE):
+    if fresh(m):
+        index = Index(np.load(index_file(m)))
+        if index.size >= size:
+            return index
+    return None
+
+# just the ids of each topic's top words, which only need beta: from the
+# index if it's up to date, but never making one, as that would mean
+# going through the papers too
+def top_words(m, size=SIZE):
+    index = cached(m, size)
+    if index is not None:
+        return index.words[:,:size]
+
+    beta = m.beta
+    return np.array([top(np.asarray(beta[t]), size) for t in range(beta.shape[0])])
+
+def load(m, size=SIZE):
+    index = cached(m, size)
+    if index is not None:
+        return index
+
+    index = build(m, size)
+    save(m, index)
+    return index
+
+def run(d, ks, size=SIZE):
+    r = model.open_run(d)
+    for k in ks or r.ks():
+        m = r.model(k)
+        if cached(m, size) is not None:
+            print "lda%d: already indexed" % k
+        else:
+            save(m, build(m, size))
+            print "lda%d: indexed the top %d words and papers of %d topics" % \
+                (k, size, m.beta.shape[0])
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "index the top words and papers of each topic, for the reports")
+    parser.add_argument('directory', help = "the run, e.g. PFX")
+    parser.add_argument('k', type = int, nargs = '*',
+                        help = "which models to index (default: all of them)")
+    parser.add_argument('--size', type = int, default = SIZE,
+                        help = "how many words and papers to keep per topic (default: %d)" % SIZE)
+    args = parser.parse_args()
+
+    run(args.directory, args.k, args.size)
@@ -0,0 +1,71 @@
+import re
+
+import numpy as np
+
+# reading and writing the files LDA-C uses, so that our own engines can
+# stand in for `lda est` without anything downstream noticing
+
+# LDA-C reads alpha with atof, so "1/50" (as in run_lda.sh) means 1
+def atof(s):
+    m = re.match(r'\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?', s)
+    if m is None:
+        return 0.0
+    return float(m.group(0))
+
+def read_settings(f):
+    settings = {'var max iter': 20, 'var convergence': 1e-6,
+                'em max iter': 100, 'em convergence': 1e-4,
+                'alpha': 'estimate'}
+
+    for line in open(f):
+        for key in settings:
+            if line.startswith(key + ' '):
+                value = line[len(key):].strip()
+                if key == 'alpha':
+                    settings[key] = value
+                elif key.endswith('iter'):
+                    settings[key] = int(value)
+                else:
+                    settings[key] = float(value)
+
+    return settings
+
+def write_model(prefix, log_beta, alpha):
+    np.savetxt(prefix + ".beta", log_beta, fmt=' %5.10f', delimiter='')
+
+    other = open(prefix + ".other", "w")
+    other.write("num_topics %d\n" % log_beta.shape[0])
+    other.write("num_terms %d\n" % log_beta.shape[1])
+    other.write("alpha %5.10f\n" % alpha)
+    other.close()
+
+def read_other(prefix):
+    other = {}
+    for line in open(prefix + ".other"):
+        (key,value) = line.split()
+        other[key] = float(value) if key == 'alpha' else int(value)
+    return other
+
+def read_model(prefix):
+    other = read_other(prefix)
+    log_beta = np.loadtxt(prefix + ".beta", ndmin=2)
+    return (log_beta.reshape(other['num_topics'], other['num_terms']), other['alpha'])
+
+def write_gamma(f, gamma):
+    np.savetxt(f, gamma, fmt='%5.10f', delimiter=' ')
+
+def read_gamma(f):
+    return np.loadtxt(f, ndmin=2)
+
+def likelihood_line(likelihood, converged):
+    return "%10.10f\t%5.5e\n" % (likelihood, converged)
+
+def write_word_assignments(f, corpus, topics):
+    out = open(f, "w")
+    for d in xrange(len(corpus)):
+        (start,end) = corpus.offsets[d], corpus.offsets[d+1]
+        out.write("%03d" % (end - start))
+        for (w,z) in zip(corpus.terms[start:end].tolist(), topics[start:end].tolist()):
+            out.write(" %04d:%02d" % (w, z))
+        out.write("\n")
+    out.close()
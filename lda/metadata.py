@@ -0,0 +1,249 @@
+import argparse
+import sys, os
+import re
+import json
+import codecs
+import array
+
+import numpy as np
+
+import corpus
+import model
+
+# docs.dat as a table, which parse.py writes next to it: each paper's
+# title, authors, conference, and year, in the same order as docs.dat (so
+# a paper's row is its line number, from 0). for docs.dat in PFX,
+#
+#   PFX/docs.titles          every title, in UTF-8, one after the other
+#   PFX/docs.title_offsets   where each title starts, plus where the last ends
+#   PFX/docs.authors         every paper's authors, one per line, in UTF-8
+#   PFX/docs.author_offsets  where each paper's authors start, likewise
+#   PFX/docs.confs           each paper's conference, as a number (int16)
+#   PFX/docs.years           and its year, likewise
+#   PFX/docs.names           the conferences and years those numbers stand
+#                            for, and the rows of each conference's years
+#
+# the binary files are laid out as corpus.py's are. docs.names is JSON:
+# {"confs": [...], "years": [...], "index": {conf: {year: [[start, end], ...]}}}
+# where each [start, end] is a run of rows (end not included).
+#
+# with the index, a filter like "POPL 2005-2015" picks out its papers
+# without looking at any titles:
+#
+#   python metadata.py PFX "POPL 2005-2015"
+
+suffixes = {'titles': '|u1', 'title_offsets': '<i8',
+            'authors': '|u1', 'author_offsets': '<i8',
+            'confs': '<i2', 'years': '<i2'}
+
+def table_files(prefix):
+    files = dict((s, prefix + '.' + s) for s in suffixes)
+    files['names'] = prefix + '.names'
+    return files
+
+def has_table(prefix):
+    return all(os.path.exists(f) for f in table_files(prefix).values())
+
+# numbers things in order of first appearance
+class Codes(object):
+    def __init__(self, keys=()):
+        self.keys = []
+        self.index = {}
+        for k in keys:
+            self(k)
+
+    def __call__(self, x):
+        if x not in self.index:
+            self.index[x] = len(self.keys)
+            self.keys.append(x)
+        return self.index[x]
+
+# runs of rows with the same conference and year, by conference and year
+def make_index(confs, years, conf_names, year_names):
+    index = {}
+    start = 0
+    for i in xrange(1, len(confs) + 1):
+        if i == len(confs) or (confs[i], years[i]) != (confs[start], years[start]):
+            (conf, year) = (conf_names[confs[start]], year_names[years[start]])
+            index.setdefault(conf, {}).setdefault(year, []).append([start, i])
+            start = i
+    return index
+
+class Table(object):
+    def __init__(self, titles, title_offsets, authors, author_offsets, confs, years,
+                 conf_names, year_names, index=None):
+        self.titles = titles
+        self.title_offsets = title_offsets
+        self.authors = authors
+        self.author_offsets = author_offsets
+        self.confs = confs
+        self.years = years
+        self.conf_names = conf_names
+        self.year_names = year_names
+        self.index = index if index is not None else \
+            make_index(confs, years, conf_names, year_names)
+
+    def __len__(self):
+        return len(self.confs)
+
+    def title(self, i):
+        return self.titles[self.title_offsets[i]:self.title_offsets[i+1]].tostring().decode("utf8")
+
+    def author_list(self, i):
+        s = self.authors[self.author_offsets[i]:self.author_offsets[i+1]].tostring().decode("utf8")
+        return s.split(u'\n') if s else []
+
+    def conf(self, i):
+        return self.conf_names[self.confs[i]]
+
+    def year(self, i):
+        return self.year_names[self.years[i]]
+
+    # the runs of rows of the papers a filter picks out, in order
+    def ranges(self, spec):
+        found = []
+        for (conf, first, last) in parse_filter(spec):
+            for c in self.index:
+                if conf is not None and c.lower() != conf.lower():
+                    continue
+                for (year, runs) in self.index[c].iteritems():
+                    y = int(year) if year.isdigit() else None
+                    if first is None or (y is not None and first <= y <= last):
+                        found.extend(runs)
+
+        merged = []
+        for (start, end) in sorted(found):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [tuple(r) for r in merged]
+
+    # and as a bitmap, a bool for every row
+    def rows(self, spec):
+        mask = np.zeros(len(self), dtype=bool)
+        for (start, end) in self.ranges(spec):
+            mask[start:end] = True
+        return mask
+
+# "POPL 2005-2015", "POPL 2005", "POPL", "2005-2015", or several of those
+# with commas between, as (conference, first year, last year), with None
+# for any
+filter_part = re.compile(u'^(.*?)\\s*(?:(\\d+)(?:\\s*[-\u2013]\\s*(\\d+))?)?$', re.UNICODE)
+
+def parse_filter(spec):
+    if isinstance(spec, str):
+        spec = spec.decode("utf8")
+
+    parts = []
+    for part in spec.split(u','):
+        m = filter_part.match(part.strip())
+        conf = m.group(1) or None
+        (first, last) = (m.group(2), m.group(3) or m.group(2))
+        if first is None:
+            parts.append((conf, None, None))
+        else:
+            parts.append((conf, int(first), int(last)))
+    return parts
+
+class TableWriter(object):
+    def __init__(self, prefix):
+        self.files = table_files(prefix)
+        self.out = dict((s, open(self.files[s], "wb")) for s in suffixes)
+        for s in suffixes:
+            corpus.write_header(self.out[s], suffixes[s], 0)
+
+        self.sizes = dict((s, 0) for s in suffixes)
+        self.confs = Codes()
+        self.years = Codes()
+        self.conf_codes = array.array('h')
+        self.year_codes = array.array('h')
+        for s in ['title_offsets', 'author_offsets']:
+            self.write(s, [0])
+
+    def write(self, s, values):
+        np.asarray(values, dtype=suffixes[s]).tofile(self.out[s])
+        self.sizes[s] += len(values)
+
+    def write_text(self, s, text):
+        data = text.encode("utf8")
+        self.out[s].write(data)
+        self.sizes[s] += len(data)
+        self.write(s[:-1] + '_offsets', [self.sizes[s]])
+
+    def add(self, title, authors, conf, year):
+        self.write_text('titles', title)
+        self.write_text('authors', u'\n'.join(authors))
+
+        self.conf_codes.append(self.confs(conf))
+        self.year_codes.append(self.years(year))
+        self.write('confs', [self.conf_codes[-1]])
+        self.write('years', [self.year_codes[-1]])
+
+    def close(self):
+        for s in suffixes:
+            corpus.write_header(self.out[s], suffixes[s], self.sizes[s])
+            self.out[s].close()
+
+        names = codecs.open(self.files['names'], "w", "utf8")
+        json.dump({'confs': self.confs.keys, 'years': self.years.keys,
+                   'index': make_index(self.conf_codes, self.year_codes,
+                                       self.confs.keys, self.years.keys)},
+                  names, ensure_ascii=False, sort_keys=True)
+        names.close()
+
+def load(prefix):
+    files = table_files(prefix)
+    arrays = dict((s, corpus.read_array(files[s])) for s in suffixes)
+    names = json.load(open(files['names']))
+    return Table(arrays['titles'], arrays['title_offsets'],
+                 arrays['authors'], arrays['author_offsets'],
+                 arrays['confs'], arrays['years'],
+                 names['confs'], names['years'], names['index'])
+
+# for runs from before parse.py wrote tables: what we can get back from
+# docs.dat itself. the authors were written with nothing between them, so
+# each paper's authors come back as one
+def from_docs(docs):
+    (confs, years) = (Codes(), Codes())
+    (titles, authors, conf_codes, year_codes) = ([], [], [], [])
+    for doc in docs:
+        (year, conf, heading) = model.split_title(doc)
+        (title, _, names) = heading.rpartition(u' - ') if u' - ' in heading else (heading, u'', u'')
+        titles.append(title.encode("utf8"))
+        authors.append(names.encode("utf8"))
+        conf_codes.append(confs(conf))
+        year_codes.append(years(year))
+
+    def blob(strings):
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(s) for s in strings])
+        return (np.frombuffer(''.join(strings), dtype=np.uint8), offsets)
+
+    return Table(*(blob(titles) + blob(authors) +
+                   (np.array(conf_codes, dtype=np.int16), np.array(year_codes, dtype=np.int16),
+                    confs.keys, years.keys)))
+
+def run(d, spec=None):
+    table = model.open_run(d).table
+    if spec is None:
+        for conf in sorted(table.index):
+            years = sorted(table.index[conf])
+            papers = sum(end - start for y in years for (start, end) in table.index[conf][y])
+            print "%s: %d papers, %s-%s" % (conf, papers, years[0], years[-1])
+        return
+
+    ranges = table.ranges(spec)
+    print "%d papers, in rows %s" % \
+        (sum(end - start for (start, end) in ranges),
+         ', '.join("%d-%d" % (start, end - 1) for (start, end) in ranges))
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "look up papers by conference and year")
+    parser.add_argument('directory', help = "the run, e.g. PFX")
+    parser.add_argument('filter', nargs = '?',
+                        help = "e.g. \"POPL 2005-2015\" (default: list the conferences)")
+    args = parser.parse_args()
+
+    run(args.directory, args.filter)
@@ -0,0 +1,203 @@
+import sys, os
+import re
+import codecs
+
+import ldac
+import store
+import index
+import metadata
+
+# the runs in out/ and their models, for scripts (and interactive
+# sessions) that look at them:
+#
+#   import model
+#   run = model.open_run("2016-12-11_00:44")
+#   m = run.model(200)
+#   m.beta, m.gamma, run.docs, run.vocab
+#
+# nothing is read until it's first asked for, and then it's kept, so
+# looking at a model again (or from another script's run()) is free.
+# open_run gives the same Run every time it's given the same run.
+#
+# runs have been laid out a few ways over time: PFX/ldaK and PFX/docs.dat
+# (now), PFX/PFX_ldaK and PFX/PFX_docs.dat (in some of out/), and PFX_ldaK
+# and PFX_docs.dat side by side (before that). Run.path finds the file
+# whichever way it's laid out.
+
+out_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "out")
+
+title = re.compile(u'(.*) \((.*) (\\d*)\)$')
+
+# a docs.dat line as (year, conference, title)
+def split_title(doc):
+    m = title.match(doc)
+    if m is None:
+        raise ValueError("can't find the conference and year in %r" % doc)
+    return (m.group(3), m.group(2), m.group(1))
+
+def read(f, enc="utf8"):
+    return map(lambda s: s.strip(),codecs.open(f,"r",enc).readlines())
+
+# an attribute computed on first use, and then kept
+class lazy(object):
+    def __init__(self, f):
+        self.f = f
+        self.__name__ = f.__name__
+        self.__doc__ = f.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = self.f(obj)
+        obj.__dict__[self.__name__] = value
+        return value
+
+class Run(object):
+    def __init__(self, d, docs_file=None, vocab_file=None):
+        self.d = os.path.normpath(d)
+        self.name = os.path.basename(self.d)
+        self.docs_file = docs_file or self.path("docs.dat")
+        self.vocab_file = vocab_file or self.path("vocab.dat")
+        self.models = {}
+
+    def path(self, name):
+        candidates = [os.path.join(self.d, name),
+                      os.path.join(self.d, self.name + "_" + name),
+                      self.d + "_" + name]
+        for f in candidates:
+            if os.path.exists(f):
+                return f
+        return candidates[0]
+
+    @lazy
+    def docs(self):
+        return read(self.docs_file)
+
+    @lazy
+    def vocab(self):
+        return read(self.vocab_file)
+
+    # (year, conference, title) for every paper
+    @lazy
+    def papers(self):
+        return map(split_title, self.docs)
+
+    # docs.dat as a table (see metadata.py): the one parse.py wrote, if
+    # it's there and up to date, and otherwise one made from docs.dat
+    @lazy
+    def table(self):
+        prefix = os.path.splitext(self.docs_file)[0]
+        if metadata.has_table(prefix) and \
+           (not os.path.exists(self.docs_file) or
+            os.path.getmtime(prefix + ".names") >= os.path.getmtime(self.docs_file)):
+            return metadata.load(prefix)
+        return metadata.from_docs(self.docs)
+
+    def model(self, k):
+        if k not in self.models:
+            self.models[k] = Model(os.path.join(self.path("lda%d" % k), "final"), self, k)
+        return self.models[k]
+
+    # the Ks that have been trained
+    def ks(self):
+        ks = set()
+        for d in [self.d, os.path.dirname(self.d)]:
+            if os.path.isdir(d):
+                for f in os.listdir(d):
+                    m = re.search(r'lda(\d+)$', f)
+                    if m:
+                        ks.add(int(m.group(1)))
+        return sorted(k for k in ks
+                      if os.path.exists(os.path.join(self.path("lda%d" % k), "final.gamma")))
+
+class Model(object):
+    # prefix is as LDA-C names it, e.g. PFX/lda200/final
+    def __init__(self, prefix, run=None, k=None):
+        self.prefix = prefix
+        self.d = os.path.dirname(prefix)
+        self.run = run
+        self.k = k
+
+    def path(self, name):
+        return os.path.join(self.d, name)
+
+    # K x V log topic-word weights, and D x K topic weights per paper;
+    # see store.py
+    @lazy
+    def beta(self):
+        return store.load_beta(self.prefix)
+
+    @lazy
+    def gamma(self):
+        return store.load_gamma(self.prefix)
+
+    @lazy
+    def other(self):
+        return ldac.read_other(self.prefix)
+
+    @lazy
+    def alpha(self):
+        return self.other['alpha']
+
+    @lazy
+    def num_topics(self):
+        if os.path.exists(self.prefix + ".other"):
+            return self.other['num_topics']
+        if 'gamma' in self.__dict__ or store.fresh(self.prefix + ".gamma"):
+            return self.gamma.shape[1]
+        return len(open(self.prefix + ".gamma").readline().split())
+
+    # see index.py
+    @lazy
+    def index(self):
+        return index.load(self)
+
+    def ensure_index(self, n):
+        if n > self.index.size:
+            self.index = index.load(self, n)
+        return self.index
+
+    # the ids and weights of topic t's top n words, biggest first
+    def top_words(self, t, n):
+        i = self.ensure_index(n)
+        return (i.words[t,:n], i.word_weights[t,:n])
+
+    # and its top n papers
+    def top_papers(self, t, n):
+        i = self.ensure_index(n)
+        return (i.papers[t,:n], i.paper_weights[t,:n])
+
+    @property
+    def docs(self):
+        return self.run.docs
+
+    @property
+    def vocab(self):
+        return self.run.vocab
+
+    @property
+    def papers(self):
+        return self.run.papers
+
+runs = {}
+
+# a run by its directory, or by its name in out/
+def open_run(name):
+    d = name
+    if not os.path.exists(d) and not os.path.exists(d + "_docs.dat"):
+        d = os.path.join(out_dir, name)
+    d = os.path.abspath(d)
+
+    if d not in runs:
+        runs[d] = Run(d)
+    return runs[d]
+
+def open_model(name, k):
+    return open_run(name).model(k)
+
+# a model given by its files, as the older scripts take them: e.g.,
+# PFX/lda200/final.gamma and PFX/docs.dat
+def from_files(model_file, docs_file=None, vocab_file=None):
+    prefix = os.path.splitext(model_file)[0]
+    d = os.path.dirname(docs_file or vocab_file or os.path.dirname(prefix)) or os.curdir
+    return Model(prefix, Run(d, docs_file, vocab_file))
@@ -0,0 +1,184 @@
+import argparse
+import sys, os
+import re
+import math
+import datetime
+import time
+
+import json
+
+import ldac
+import checkpoint
+
+# watches the models of a run train, by following each one's
+# likelihood.dat as it grows. for every new iteration, we show how much
+# the likelihood changed, how long the iteration took, and roughly how
+# long is left: until the change drops below `em convergence` (guessing
+# that it keeps shrinking as it has been), or `em max iter` is reached.
+#
+# with --patience N, we also ask a model to stop (see checkpoint.py) once
+# it has improved by less than --min-change for N iterations in a row.
+#
+# we're done once every model is, or has failed for good (as the
+# sweep's PFX/sweep.json says; see sweep.py).
+
+model_dir = re.compile(r'lda\d+$')
+
+class Watch(object):
+    def __init__(self, d):
+        self.d = d
+        self.name = os.path.basename(os.path.normpath(d))
+        self.reset()
+
+    def reset(self):
+        self.pos = 0
+        self.iterations = 0
+        self.changes = []
+        self.times = []
+        self.flat = 0
+        self.seen = None
+        self.stopped = checkpoint.stop_requested(self.d)
+
+    def done(self):
+        return os.path.exists(os.path.join(self.d, "final.gamma"))
+
+    # the iterations that have finished since we last looked
+    def poll(self, min_change):
+        f = os.path.join(self.d, "likelihood.dat")
+
+        # a resumed run cuts its likelihoods back to its last checkpoint
+        # (see train.py), so we start over from what's left
+        if os.path.exists(f) and os.path.getsize(f) < self.pos:
+            self.reset()
+
+        (text, self.pos) = checkpoint.read_lines(f, self.pos)
+        lines = text.splitlines()
+        now = time.time()
+
+        # we can only time what we see happen
+        took = None
+        if lines and self.seen is not None:
+            took = (now - self.seen) / len(lines)
+        if lines or self.seen is None:
+            self.seen = now
+
+        new = []
+        for line in lines:
+            (likelihood, change) = map(float, line.split())
+            self.iterations += 1
+            if self.iterations > 1:
+                self.changes.append(change)
+            self.flat = self.flat + 1 if self.iterations > 1 and change < min_change else 0
+            if took is not None:
+                self.times.append(took)
+            new.append((self.iterations, likelihood, change, took))
+        return new
+
+    # how many more iterations until the change gets below threshold, if
+    # it keeps shrinking at the rate it has lately
+    def iterations_until(self, threshold):
+        recent = self.changes[-4:]
+        if len(recent) < 2 or any(c <= 0 for c in recent):
+            return None
+        if recent[-1] < threshold:
+            return 0
+
+        rate = (recent[-1] / recent[0]) ** (1.0 / (len(recent) - 1))
+        if rate >= 1:
+            return None
+        return int(math.ceil(math.log(threshold / recent[-1]) / math.log(rate)))
+
+    def eta(self, settings, min_change, patience):
+        if not self.times:
+            return None
+
+        left = [settings['em max iter'] + 1 - self.iterations]
+        n = self.iterations_until(settings['em convergence'])
+        if n is not None:
+            left.append(n)
+        n = self.iterations_until(min_change)
+        if patience and n is not None:
+            left.append(n + patience - (self.flat if n == 0 else 0))
+
+        per = sum(self.times[-5:]) / len(self.times[-5:])
+        return max(min(left), 0) * per
+
+# whether a model is finished, one way or the other
+def settled(m):
+    if os.path.exists(os.path.join(m, "final.gamma")):
+        return True
+
+    f = os.path.join(os.path.dirname(os.path.normpath(m)), "sweep.json")
+    if not os.path.exists(f):
+        return False
+    try:
+        status = json.load(open(f))
+    except ValueError:
+        return False
+    k = os.path.basename(os.path.normpath(m))[len("lda"):]
+    return status.get(k, {}).get('train') == 'failed'
+
+def format_time(seconds):
+    if seconds is None:
+        return "?"
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+def watches(d, ks):
+    if ks:
+        names = ["lda%d" % k for k in ks]
+    elif model_dir.match(os.path.basename(os.path.normpath(d))):
+        return [d]
+    else:
+        names = [f for f in sorted(os.listdir(d)) if model_dir.match(f)]
+    return [os.path.join(d, f) for f in names if os.path.isdir(os.path.join(d, f))]
+
+def run(d, ks, settings, interval=10, patience=0, min_change=1e-4):
+    watching = {}
+    while True:
+        for m in watches(d, ks):
+            if m not in watching:
+                watching[m] = Watch(m)
+
+        for w in sorted(watching.values(), key=lambda w: w.name):
+            for (i, likelihood, change, took) in w.poll(min_change):
+                print "%s iteration %3d: likelihood %f, change %.2e, %s/iteration, ETA %s" % \
+                    (w.name, i, likelihood, change,
+                     "?" if took is None else "%.1fs" % took,
+                     format_time(w.eta(settings, min_change, patience)))
+
+                if patience and w.flat >= patience and not w.stopped and not w.done():
+                    reason = "improved by less than %g for %d iterations" % (min_change, patience)
+                    checkpoint.request_stop(w.d, reason)
+                    w.stopped = True
+                    print "%s: asked to stop; %s" % (w.name, reason)
+        sys.stdout.flush()
+
+        # until everything we know of is done (or has failed), and nothing
+        # more is coming
+        expected = set(watches(d, ks)) | set(watching)
+        if ks:
+            expected |= set(os.path.join(d, "lda%d" % k) for k in ks)
+        if expected and all(settled(m) for m in expected):
+            break
+
+        time.sleep(interval)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "follow the training of a run's models, and stop them when they level off")
+    parser.add_argument('directory', help = "a run (e.g. PFX) or one model (e.g. PFX/lda200)")
+    parser.add_argument('k', type = int, nargs = '*',
+                        help = "which models of the run to watch (default: all of them)")
+    parser.add_argument('--settings', default = 'settings.txt',
+                        help = "the settings the models were trained with (default: settings.txt)")
+    parser.add_argument('--interval', type = float, default = 10, metavar = "SECONDS",
+                        help = "how often to look (default: 10)")
+    parser.add_argument('--patience', type = int, default = 0, metavar = "N",
+                        help = "stop a model after N iterations in a row of little improvement "
+                               "(default: never)")
+    parser.add_argument('--min-change', type = float, default = 1e-4,
+                        help = "the relative change in likelihood that counts as little (default: 1e-4)")
+    args = parser.parse_args()
+
+    run(args.directory, args.k, ldac.read_settings(args.settings), args.interval,
+        args.patience, args.min_change)
@@ -0,0 +1,255 @@
+import argparse
+import sys, os
+import json
+import time
+import tempfile
+
+import numpy as np
+from scipy.special import psi
+
+import corpus
+import ldac
+import vem
+import checkpoint
+
+# online variational Bayes for LDA (Hoffman, Blei, and Bach 2010). rather
+# than run the E-step over the whole corpus before every M-step, we read
+# abstracts.dat a minibatch at a time and nudge the topics towards what
+# each minibatch says, by a step rho = (tau0 + t)^-kappa that shrinks as
+# we see more. only the topics' (K x V) Dirichlet parameters, lambda, and
+# one minibatch are ever in memory.
+#
+# the model is saved as PFX.lambda.npy and PFX.online (the rest of its
+# state), next to the usual LDA-C files, so a later run can start from it
+# and learn from new documents without going over the old ones again:
+#
+#   python online.py est 1/50 50 settings.txt PFX/abstracts.dat seeded PFX/lda50
+#   python online.py est 1/50 50 settings.txt new.dat PFX/lda50/final PFX/lda50
+#
+# the state includes the data files the model has learned from, so that
+# final.gamma can have every paper, old and new, in order. they're saved
+# relative to the model's directory, so they still work after the run
+# moves (e.g., run_lda.sh moving it to ../out).
+
+CHECKPOINT = 20         # save the model every CHECKPOINT minibatches
+
+class OnlineLDA(object):
+    def __init__(self, lam, alpha, eta, tau0, kappa, updates=0, docs=0, data_files=None):
+        self.lam = lam
+        self.alpha = alpha
+        self.eta = eta
+        self.tau0 = tau0
+        self.kappa = kappa
+        self.updates = updates
+        self.docs = docs
+        self.data_files = data_files or []
+
+    # new documents may use words we've never seen; we know nothing about
+    # them yet but the prior
+    def grow(self, V):
+        (K,old) = self.lam.shape
+        if V > old:
+            self.lam = np.hstack([self.lam, np.ones((K, V - old)) * self.eta])
+
+    def exp_elog_beta(self):
+        return np.exp(psi(self.lam) - psi(self.lam.sum(axis=1))[:,np.newaxis])
+
+    # the topic-word probabilities we'd expect
+    def log_beta(self):
+        return np.log(self.lam) - np.log(self.lam.sum(axis=1))[:,np.newaxis]
+
+    # learns from one minibatch of a corpus of D documents; returns the
+    # documents' part of the variational bound, scaled up to the corpus
+    def update(self, data, D, settings):
+        self.grow(data.num_terms())
+        batch = vem.Batch(data, 0, len(data))
+
+        (gamma, likelihood, _, phi) = vem.infer_batch(
+            batch, self.exp_elog_beta(), self.alpha,
+            settings['var max iter'], settings['var convergence'])
+
+        sstats = np.zeros(self.lam.shape)
+        sstats[:,batch.vocab] = batch.by_word.dot(batch.counts[:,np.newaxis] * phi).T
+
+        rho = (self.tau0 + self.updates) ** -self.kappa
+        self.lam = (1 - rho) * self.lam + rho * (self.eta + float(D) / len(data) * sstats)
+        self.updates += 1
+
+        return likelihood.sum() * D / len(data)
+
+    def infer(self, data, settings):
+        self.grow(data.num_terms())
+        (gamma, _, _) = vem.infer(data, np.log(self.exp_elog_beta()), self.alpha,
+                                  settings['var max iter'], settings['var convergence'])
+        return gamma
+
+    def save(self, prefix):
+        np.save(prefix + ".lambda.npy", self.lam)
+
+        here = os.path.dirname(os.path.abspath(prefix))
+        state = {'alpha': self.alpha, 'eta': self.eta, 'tau0': self.tau0,
+                 'kappa': self.kappa, 'updates': self.updates, 'docs': self.docs,
+                 'data_files': [os.path.relpath(f, here) for f in self.data_files]}
+        out = open(prefix + ".online", "w")
+        json.dump(state, out, indent=1, sort_keys=True)
+        out.close()
+
+def load(prefix):
+    state = json.load(open(prefix + ".online"))
+
+    # older models saved absolute paths, which join leaves alone
+    here = os.path.dirname(os.path.abspath(prefix))
+    state['data_files'] = [os.path.normpath(os.path.join(here, f))
+                           for f in state.get('data_files', [])]
+
+    return OnlineLDA(np.load(prefix + ".lambda.npy"), **state)
+
+def estimate(data_file, alpha, K, settings, start, d, batch_size=256, passes=1,
+             skip=0, eta=0.01, tau0=None, kappa=None, seed=None, resume=False):
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    checkpoint.clear_stop(d)
+
+    saved = checkpoint.load(d) if resume else None
+    if saved is not None and saved['engine'] == 'online':
+        # the model as it was after the last minibatch we saved
+        model = load(os.path.join(d, "checkpoint"))
+        D = saved['docs']
+        (first_pass, first_batch) = (saved['pass'], saved['batch'])
+        likelihood_old = saved['likelihood']
+
+        print "resuming from pass %d, minibatch %d" % (first_pass + 1, first_batch)
+        lines = saved['lines']
+        checkpoint.truncate_likelihoods(d, lines)
+        likelihood_file = open(os.path.join(d, "likelihood.dat"), "a")
+    else:
+        fresh = start in ("seeded", "random")
+        if fresh:
+            rng = np.random.RandomState(seed)
+            lam = rng.gamma(100.0, 1.0 / 100.0, (K, corpus.count_terms(data_file)))
+            model = OnlineLDA(lam, alpha, eta, 1024.0, 0.7)
+        else:
+            # a saved model, e.g. PFX/lda50/final, which brings its own alpha
+            model = load(start)
+
+        # everything we've learned from, old documents and new
+        D = model.docs + max(0, corpus.count_docs(data_file) - skip)
+
+        # a data file that skips at least as many papers as the model has
+        # seen has the old papers itself; otherwise, they're in the files
+        # the model learned from before
+        if fresh or skip >= model.docs:
+            model.data_files = [os.path.abspath(data_file)]
+        else:
+            if not model.data_files:
+                print "warning: %s doesn't say what it learned from, so final.gamma will only have %s" % \
+                    (start, data_file)
+            model.data_files = model.data_files + [os.path.abspath(data_file)]
+        (first_pass, first_batch) = (0, 0)
+        likelihood_old = 0.0
+
+        # carry on where the saved model's likelihoods left off
+        f = os.path.join(d, "likelihood.dat")
+        lines = 0 if fresh or not os.path.exists(f) else len(open(f).readlines())
+        likelihood_file = open(f, "w" if fresh else "a")
+
+    # final.gamma needs every file the model has learned from; better to
+    # find out one is missing now than after all the work
+    for f in model.data_files:
+        if not os.path.exists(f):
+            raise IOError("%s learned from %s, which is missing" % (start, f))
+
+    if tau0 is not None:
+        model.tau0 = tau0
+    if kappa is not None:
+        model.kappa = kappa
+
+    stopped = False
+    for p in xrange(first_pass, passes):
+        # skip the minibatches of this pass we've already done
+        done = first_batch if p == first_pass else 0
+        batches = corpus.chunks(data_file, batch_size, skip + done * batch_size)
+
+        for (i,batch) in enumerate(batches, done):
+            began = time.time()
+            likelihood = model.update(batch, D, settings)
+
+            if likelihood_old == 0.0:
+                converged = float('inf')
+            else:
+                converged = (likelihood_old - likelihood) / likelihood_old
+            likelihood_old = likelihood
+
+            likelihood_file.write(ldac.likelihood_line(likelihood, converged))
+            likelihood_file.flush()
+            lines += 1
+            print "pass %d, minibatch %d: likelihood %f (%.1fs)" % \
+                (p + 1, i + 1, likelihood, time.time() - began)
+
+            if model.updates % CHECKPOINT == 0:
+                model.save(os.path.join(d, "checkpoint"))
+                checkpoint.save(d, engine='online', docs=D, likelihood=likelihood,
+                                lines=lines, **{'pass': p, 'batch': i + 1})
+
+            if checkpoint.stop_requested(d):
+                print "stopping early: " + checkpoint.take_stop(d)
+                stopped = True
+                break
+        if stopped:
+            break
+
+    likelihood_file.close()
+    model.docs = D
+
+    prefix = os.path.join(d, "final")
+
+    # the topics of every paper the model has learned from, old and new,
+    # in order, a minibatch at a time. we do this before saving the model,
+    # so that if an old data file is missing, the saved model is still
+    # the one we started from, and a rerun doesn't learn the new papers
+    # twice.
+    fd,tmp = tempfile.mkstemp(dir=d)
+    out = os.fdopen(fd, "w")
+    for f in model.data_files:
+        for batch in corpus.chunks(f, batch_size):
+            ldac.write_gamma(out, model.infer(batch, settings))
+    out.close()
+    os.rename(tmp, prefix + ".gamma")
+
+    model.save(prefix)
+    ldac.write_model(prefix, model.log_beta(), model.alpha)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "online variational Bayes for LDA, compatible with LDA-C")
+    sub = parser.add_subparsers(dest = 'mode')
+
+    est = sub.add_parser('est', help = "estimate (or update) a model, like `lda est`")
+    est.add_argument('--batch-size', type = int, default = 256,
+                     help = "documents per minibatch (default: 256)")
+    est.add_argument('--passes', type = int, default = 1,
+                     help = "times to go through the corpus (default: 1)")
+    est.add_argument('--skip', type = int, default = 0, metavar = "N",
+                     help = "only learn from the documents after the first N")
+    est.add_argument('--eta', type = float, default = 0.01,
+                     help = "Dirichlet prior on topics' words (default: 0.01)")
+    est.add_argument('--tau0', type = float,
+                     help = "how much to slow down early updates (default: 1024, or the saved model's)")
+    est.add_argument('--kappa', type = float,
+                     help = "how fast the step size decays, between 0.5 and 1 (default: 0.7, or the saved model's)")
+    est.add_argument('--seed', type = int,
+                     help = "random seed (default: different every time)")
+    est.add_argument('--resume', action = 'store_true',
+                     help = "carry on from the last checkpoint in the directory, if there is one")
+    est.add_argument('alpha')
+    est.add_argument('k', type = int)
+    est.add_argument('settings')
+    est.add_argument('data')
+    est.add_argument('start', help = "seeded, random, or a saved online model (e.g. PFX/lda50/final)")
+    est.add_argument('directory')
+
+    args = parser.parse_args()
+
+    estimate(args.data, ldac.atof(args.alpha), args.k, ldac.read_settings(args.settings),
+             args.start, args.directory, args.batch_size, args.passes, args.skip,
+             args.eta, args.tau0, args.kappa, args.seed, args.resume)
@@ -2,8 +2,17 @@ import json
 import argparse
 import sys, os, glob
 import codecs
+import multiprocessing
+import hashlib
+import pickle
+import tempfile
+import re
+import collections
 
 import utils
+import corpus
+import dedup
+import metadata
 import nltk
 
 use_wordnet = True
@@ -14,6 +23,9 @@ else:
     stemmer = nltk.stem.porter.PorterStemmer()
     stem = stemmer.stem
 
+# most tokens are repeats, so we only ask the stemmer about new ones
+lemmas = utils.LemmaCache(stem, name=type(stemmer).__name__)
+
 stops = set(map(lambda s: s.strip(),
                 codecs.open("stopwords.dat","r","utf8").readlines()))
 
@@ -32,16 +44,40 @@ def tokenize(text):
 def no_crlf(s):
     return ' '.join(s.split())
 
+def doc_meta(f,doc):
+    conf = os.path.basename(os.path.dirname(f))
+    title = doc.get('title',"").strip()
+    authors = ' '.join(map(no_crlf, doc.get('authors',"")))
+    meta = title + " - " + authors + " (" + conf + ")"
+
+    return meta.replace('"','\\"')
+
+# a document's docs.dat line, and what it's made of, for the metadata
+# table (see metadata.py)
+Meta = collections.namedtuple('Meta', 'line title authors conf year')
+
+# a directory like "POPL 2005" as its conference and year, as post.py
+# and by_year.py would split them out of docs.dat
+def conf_year(name):
+    m = re.match(r'(.*) (\d*)$', name)
+    if m is None:
+        return (name, u"")
+    return (m.group(1), m.group(2))
+
+def doc_info(f,doc):
+    (conf,year) = conf_year(os.path.basename(os.path.dirname(f)))
+    title = doc.get('title',"").strip()
+    authors = map(no_crlf, doc.get('authors',[]))
+
+    return Meta(doc_meta(f,doc), title, authors, conf, year)
+
 def parse(f):
     doc = json.load(open(f))
 
     # if ('abs' not in doc): print file + " is missing an abstract"
     # if ('title' not in doc): print file + " is missing a title"
 
-    conf = os.path.basename(os.path.dirname(f))
     title = doc.get('title',"").strip()
-    authors = ' '.join(map(no_crlf, doc.get('authors',"")))
-    meta = title + " - " + authors + " (" + conf + ")"
 
     (base,_) = os.path.splitext(f)
     pdf = base + "-fulltext.txt"
@@ -57,47 +93,309 @@ def parse(f):
     else:
         print "Couldn't find an abstract or a PDF for " + title + " (" + base + ")"
         text = title
+    tokens = tokenize(text)
+
+    # when looking for duplicates, the abstract's tokens too, as they'd
+    # be for a copy of the paper with just its abstract (None if it has
+    # no abstract)
+    abstract = None
+    if dedup_threshold and 'abs' in doc:
+        abstract = tokenize(title + " " + doc.get('abs',""))
+
+    return (doc_info(f,doc), tokens, abstract)
+
+def count_words(doc):
+    # counts are kept in order of first occurrence, so merging them
+    # builds exactly the same dicts as a token-by-token pass would
+    counts = {}
+    order = []
+    for word in doc:
+        if word not in counts:
+            counts[word] = 0
+            order.append(word)
+        counts[word] += 1
+
+    return [(word,counts[word]) for word in order]
+
+# the parse cache maps a hash of each document's json (and fulltext, if
+# any) to its word counts, so reruns only parse new or edited documents.
+# the hash also covers everything else that goes into the counts, so
+# changing the stopwords or the stemmer starts the cache afresh.
+doc_cache = None
+doc_cache_version = 3
+recipe = (u"%s %d %s" % (type(stemmer).__name__, doc_cache_version,
+                         u' '.join(sorted(stops)))).encode("utf8")
+
+def doc_key(f):
+    h = hashlib.sha1(recipe)
+    h.update(open(f,"rb").read())
+
+    (base,_) = os.path.splitext(f)
+    pdf = base + "-fulltext.txt"
+    if os.path.exists(pdf):
+        h.update('\0')
+        h.update(open(pdf,"rb").read())
+
+    return h.hexdigest()
+
+def cached_file(key):
+    return os.path.join(doc_cache, key[:2], key[2:])
+
+def read_cached(key):
+    f = cached_file(key)
+    if not os.path.exists(f):
+        return None
+
+    return pickle.load(open(f,"rb"))
+
+def write_cached(key, counts):
+    f = cached_file(key)
+    d = os.path.dirname(f)
+    try:
+        os.makedirs(d)
+    except OSError:
+        pass # already there (maybe another worker just made it)
+
+    # write and rename, so a killed run never leaves a partial entry
+    fd,tmp = tempfile.mkstemp(dir=d)
+    out = os.fdopen(fd,"wb")
+    pickle.dump(counts, out, pickle.HIGHEST_PROTOCOL)
+    out.close()
+    os.rename(tmp, f)
+
+# if we're looking for near-duplicates, the similarity they need
+dedup_threshold = None
+
+docs_reused = 0
+def parse_counts(f):
+    global docs_reused
+
+    if doc_cache:
+        key = doc_key(f)
+        cached = read_cached(key)
+        # entries from runs that weren't looking for duplicates have no signature
+        if cached is not None and (cached[2] is not None or not dedup_threshold):
+            docs_reused += 1
+            return (doc_info(f,json.load(open(f))),) + cached
+
+    title,doc,abstract = parse(f)
+    doc = map(lemmas,doc)
+    signature = None
+    if dedup_threshold:
+        # the whole text, and just the abstract (see dedup.py)
+        abstract = None if abstract is None else map(lemmas,abstract)
+        signature = (dedup.signature(doc),
+                     None if abstract is None else dedup.signature(abstract))
+    counts = (count_words(doc),len(doc),signature)
+
+    if doc_cache:
+        write_cached(key, counts)
+
+    return (title,) + counts
+
+def start_worker():
+    global docs_reused
+
+    # forget the parent's tallies, so they aren't sent back to it
+    lemmas.drain()
+    docs_reused = 0
+
+def parse_counts_learning(f):
+    global docs_reused
+
+    # workers send back the lemmas they've learned along with each document
+    parsed = parse_counts(f)
+    reused, docs_reused = docs_reused, 0
+    return (parsed,lemmas.drain(),reused)
+
+def doc_files(d):
+    for root in glob.glob(os.path.join(d,"*")):
+        year = os.path.basename(root)
+
+        files = []
+        for f in glob.glob(os.path.join(root,"*.txt")):
+            if "fulltext" in os.path.basename(f):
+                continue
+
+            files.append(f)
+
+        yield (year,files)
 
-    return (meta.replace('"','\\"'), tokenize(text))
+def parsed_docs(files, jobs=1):
+    global docs_reused
+
+    if jobs == 1:
+        for f in files:
+            yield parse_counts(f)
+        return
+
+    # imap hands results back in order, whatever order the workers finish in
+    pool = multiprocessing.Pool(jobs, start_worker)
+    parsed = pool.imap(parse_counts_learning, files, chunksize=8)
+    pool.close()
+
+    for (doc,learned,reused) in parsed:
+        lemmas.absorb(learned)
+        docs_reused += reused
+        yield doc
 
 totalwordcount = 0
-def load_docs(d):
+docfreq = {}
+def add_counts(words, counts):
+    global totalwordcount
 
+    for (word,count) in counts:
+        words[word] = words.get(word, 0) + count
+        docfreq[word] = docfreq.get(word, 0) + 1
+        totalwordcount += count
+
+def remove_counts(words, counts):
     global totalwordcount
 
+    for (word,count) in counts:
+        words[word] -= count
+        docfreq[word] -= 1
+        totalwordcount -= count
+
+        if docfreq[word] == 0:
+            del words[word]
+            del docfreq[word]
+
+# (year, file, length, signature) for every document, in order
+signatures = []
+
+def load_docs(d, jobs=1):
     years = {}
     words = dict()
 
-    for root in glob.glob(os.path.join(d,"*")):
+    listing = list(doc_files(d))
+    files = [f for (year,fs) in listing for f in fs]
+    parsed = parsed_docs(files, jobs)
 
-        year = os.path.basename(root)
-    
+    for (year,fs) in listing:
         years[year] = []
-        for f in glob.glob(os.path.join(root,"*.txt")):
-            if "fulltext" in os.path.basename(f):
-                continue
-            
-            title,doc = parse(f)
-            doc = map(stem,doc)
-            doclength = 0
-            for word in doc:
-                words[word] = words.get(word, 0) + 1
-                totalwordcount += 1
-                doclength += 1
-                      
-            years[year].append((title,doc,doclength))
+        for f in fs:
+            title,counts,doclength,signature = next(parsed)
+            add_counts(words, counts)
+            if dedup_threshold:
+                signatures.append((year,f,doclength,signature))
+
+            years[year].append((title,counts,doclength))
+
+    return (years,words)
+
+# the first pass of a streaming run: we only keep the vocabulary and the
+# file names, and the second pass (stream_dat) parses everything again
+def scan_docs(d, jobs=1):
+    years = {}
+    words = dict()
+
+    listing = list(doc_files(d))
+    files = [f for (year,fs) in listing for f in fs]
+
+    # same insertion order as load_docs, so we visit the years in the same order
+    for (year,fs) in listing:
+        years[year] = fs
+
+    parsed = parsed_docs(files, jobs)
+    for (year,fs) in listing:
+        for f in fs:
+            title,counts,doclength,signature = next(parsed)
+            add_counts(words, counts)
+            if dedup_threshold:
+                signatures.append((year,f,doclength,signature))
 
     return (years,words)
 
+# of each group of near-duplicates (alike in all their text, or in their
+# abstracts; see parse_counts), we keep the longest document, so a
+# paper's fulltext beats a copy of just its abstract, and drop the rest,
+# taking their words back out of the counts
+def drop_duplicates(years, words, stream=False, report_of="duplicates.txt"):
+    groups = dedup.find_duplicates([s[3] for s in signatures], dedup_threshold)
+
+    report = codecs.open(report_of,"w","utf8")
+    dropped = set()
+    for group in groups:
+        keep = max(group, key=lambda i: (signatures[i][2], -i))
+
+        (year,f,_,sig) = signatures[keep]
+        report.write(u"kept %s: %s\n" % (f, doc_meta(f,json.load(open(f)))))
+        for i in group:
+            if i == keep:
+                continue
+
+            (year,f,_,dup) = signatures[i]
+            report.write(u"  dropped %s (%.2f similar): %s\n" %
+                         (f, dedup.best_similarity(sig,dup), doc_meta(f,json.load(open(f)))))
+            dropped.add(f)
+    report.close()
+
+    # each year's documents are in the same order as its signatures
+    files = {}
+    for (year,f,_,_) in signatures:
+        files.setdefault(year, []).append(f)
+
+    for year in years:
+        kept = []
+        for (doc,f) in zip(years[year], files.get(year, [])):
+            if f not in dropped:
+                kept.append(doc)
+            elif stream:
+                remove_counts(words, parse_counts(f)[1])
+            else:
+                remove_counts(words, doc[1])
+        years[year] = kept
+
+    print "Dropped %d near-duplicate documents (see %s)" % (len(dropped), report_of)
+
+# keep the word ids of an earlier vocabulary, so that runs stay comparable:
+# words we've seen before keep their line, even if they're no longer used,
+# and new words go at the end
+def order_vocab(words, base=None):
+    if base is None:
+        return list(words)
+
+    known = set(base)
+    return base + [word for word in words if word not in known]
+
+# words that are too rare or too common to be worth a word id: rarer than
+# min_count tokens, in fewer than min_df documents or in more than a max_df
+# fraction of them, or outside the max_vocab most common words
+def prune_vocab(words, num_docs, min_df=1, max_df=1.0, max_vocab=None, min_count=1):
+    keep = [word for word in words
+            if words[word] >= min_count and
+               min_df <= docfreq[word] <= max_df * num_docs]
+
+    if max_vocab is not None and len(keep) > max_vocab:
+        keep.sort(key=lambda word: (-words[word], word))
+        keep = keep[:max_vocab]
+
+    return set(words).difference(keep)
+
+def report_pruning(words, dropped):
+    global totalwordcount
+
+    tokens = sum(words[word] for word in dropped)
+    print "Pruned %d of %d types and %d of %d tokens from the vocabulary" % \
+        (len(dropped), len(words), tokens, totalwordcount)
+
+    # count.dat gives frequencies among the words we kept
+    totalwordcount -= tokens
+
 def words_to_dict(words):
     return dict(zip(words, range(0, len(words))))
 
-def make_bow(doc,d):
-    bow = {}
+def make_bow(counts,d,bow=None):
+    if bow is None:
+        bow = {}
     
-    for word in doc:
+    for (word,count) in counts:
+        if word not in d:
+            continue # pruned
+
         wordid = d[word]
-        bow[wordid] = bow.get(wordid,0) + 1
+        bow[wordid] = bow.get(wordid,0) + count
 
     return bow
 
@@ -108,77 +406,177 @@ def docs_to_bow(years,d):
         bows[year] = []
 
         for (title,doc,doclength) in years[year]:
-            bows[year].append((title,make_bow(doc,d),doclength))
+            bow = make_bow(doc,d)
+            bows[year].append((title,bow,sum(bow.itervalues())))
 
     return bows
 
+# the docs.dat line for a whole conference-year, which post.py and
+# by_year.py can still split into a conference and a year
+def year_title(year):
+    (conf,y) = conf_year(year)
+    return Meta(year + " (" + year + ")", year, [], conf, y)
+
 def years_to_bow(years,d):
     bows = {}
 
     for year in years:
-        year_doc = []
-        for (title,doc) in years[year]:
-            year_doc += doc
+        # merge each document's counts into one bag for the conference-year
+        bow = {}
+        for (title,doc,doclength) in years[year]:
+            make_bow(doc,d,bow)
 
-        bows[year] = [(year,make_bow(year_doc,d))] # list for compatibility w/docs_to_bow
+        bows[year] = [(year_title(year),bow,sum(bow.itervalues()))] # list for compatibility w/docs_to_bow
 
     return bows
 
-def as_dat(bows, abs_of="abstracts.dat", doc_of="docs.dat", length_of="lengths.dat"):
-    out = open(abs_of,"w")
+binary = False
+def open_dat(abs_of="abstracts.dat", doc_of="docs.dat", length_of="lengths.dat"):
+    dats = (open(abs_of,"w"), codecs.open(doc_of,"w","utf8"), open(length_of,"w"),
+            metadata.TableWriter(os.path.splitext(doc_of)[0]))
+
+    if binary:
+        # abstracts.terms, abstracts.counts, and abstracts.offsets
+        dats += (corpus.CorpusWriter(os.path.splitext(abs_of)[0]),)
+
+    return dats
+
+def write_dat(dats, meta, bow, doclength):
+    out, doclist, lengthdoc, table = dats[:4]
+
+    if binary:
+        dats[4].add(bow.keys(), bow.values())
+
+    doclist.write(meta.line + u'\n')
+    table.add(meta.title, meta.authors, meta.conf, meta.year)
 
-    lengthdoc = open(length_of,"w")
+    lengthdoc.write(str(doclength) + u'\n')
 
-    doclist = codecs.open(doc_of,"w","utf8")
+    out.write(str(len(bow)))
+    out.write(' ')
+    for term in bow:
+        out.write(str(term))
+        out.write(':')
+        out.write(str(bow[term]))
+        out.write(' ')
+
+    out.write('\n')
+
+def close_dat(dats):
+    for f in reversed(dats):
+        f.close()
+
+def as_dat(bows, abs_of="abstracts.dat", doc_of="docs.dat", length_of="lengths.dat"):
+    dats = open_dat(abs_of, doc_of, length_of)
 
     for year in bows:
         for (title,bow,doclength) in bows[year]:
-            doclist.write(title + u'\n')
+            write_dat(dats, title, bow, doclength)
 
-            lengthdoc.write(str(doclength) + u'\n')
+    close_dat(dats)
 
-            out.write(str(len(bow)))
-            out.write(' ')
-            for term in bow:
-                out.write(str(term))
-                out.write(':')
-                out.write(str(bow[term]))
-                out.write(' ')
+def stream_dat(years, d, jobs=1, abs_of="abstracts.dat", doc_of="docs.dat", length_of="lengths.dat", by_year=False):
+    dats = open_dat(abs_of, doc_of, length_of)
 
-            out.write('\n')
+    # as_dat walks the dict that docs_to_bow rebuilds from years, which
+    # needn't iterate in the same order as years itself
+    bows = dict((year,years[year]) for year in years)
 
-    lengthdoc.close()
-    doclist.close()
-    out.close()
+    files = [f for year in bows for f in bows[year]]
+    parsed = parsed_docs(files, jobs)
+
+    for year in bows:
+        year_bow = {}
+        for f in bows[year]:
+            title,counts,doclength,signature = next(parsed)
+            if by_year:
+                make_bow(counts,d,year_bow)
+            else:
+                bow = make_bow(counts,d)
+                write_dat(dats, title, bow, sum(bow.itervalues()))
 
-def as_vocab(words, vocab_of="vocab.dat", count_of="count.dat"):
+        if by_year:
+            write_dat(dats, year_title(year), year_bow, sum(year_bow.itervalues()))
+
+    close_dat(dats)
+
+def as_vocab(vocab, words, vocab_of="vocab.dat", count_of="count.dat"):
     out = codecs.open(vocab_of,"w","utf8")
 
     countdoc = open(count_of,"w")
 
-    for word in words:
+    for word in vocab:
         out.write(word + u'\n')
-        countdoc.write(str(float(words[word])/totalwordcount) + u'\n')
+        countdoc.write(str(float(words.get(word,0))/totalwordcount) + u'\n')
 
     countdoc.close()
     out.close()
 
+def pruned_vocab(years, words, base_vocab=None, prune=None):
+    vocab = order_vocab(words, base_vocab)
+    if not prune:
+        return vocab
+
+    num_docs = sum(len(years[year]) for year in years)
+    dropped = prune_vocab(words, num_docs, **prune)
+    if base_vocab is not None:
+        # the words of the old vocabulary keep their ids, so we only
+        # prune new ones
+        dropped.difference_update(base_vocab)
+    report_pruning(words, dropped)
+
+    # compact the ids of the words that are left (all after the old
+    # vocabulary's, if there is one)
+    return [word for word in vocab if word not in dropped]
+
 by_year = False
-def run(doc_dir,doc_file,length_file,dat_file,vocab_file,count_file):
+def run(doc_dir,doc_file,length_file,dat_file,vocab_file,count_file,jobs=1,lemma_file=None,stream=False,base_vocab=None,prune=None):
 
     global by_year
-    
-    years,words = load_docs(doc_dir)
 
-    d = words_to_dict(words)
-    #print d.keys()
-    if by_year:
-        print "Running by year"
-        bows = years_to_bow(years,d)
+    if lemma_file:
+        lemmas.load(lemma_file)
+
+    if base_vocab:
+        base_vocab = utils.read(base_vocab)
+
+    if stream:
+        print "Streaming: pass 1"
+        years,words = scan_docs(doc_dir, jobs)
+
+        if dedup_threshold:
+            drop_duplicates(years, words, stream=True)
+
+        vocab = pruned_vocab(years, words, base_vocab, prune)
+        d = words_to_dict(vocab)
+
+        print "Streaming: pass 2"
+        if by_year:
+            print "Running by year"
+        stream_dat(years, d, jobs, abs_of=dat_file, doc_of=doc_file, length_of=length_file, by_year=by_year)
     else:
-        bows = docs_to_bow(years,d)
-    as_dat(bows, abs_of=dat_file, doc_of=doc_file, length_of=length_file)
-    as_vocab(words, vocab_of=vocab_file, count_of=count_file)
+        years,words = load_docs(doc_dir, jobs)
+
+        if dedup_threshold:
+            drop_duplicates(years, words)
+
+        vocab = pruned_vocab(years, words, base_vocab, prune)
+        d = words_to_dict(vocab)
+        #print d.keys()
+        if by_year:
+            print "Running by year"
+            bows = years_to_bow(years,d)
+        else:
+            bows = docs_to_bow(years,d)
+        as_dat(bows, abs_of=dat_file, doc_of=doc_file, length_of=length_file)
+
+    as_vocab(vocab, words, vocab_of=vocab_file, count_of=count_file)
+
+    if doc_cache:
+        print "Parse cache: reused %d documents" % docs_reused
+    print lemmas.stats()
+    if lemma_file:
+        lemmas.save(lemma_file)
 
 if __name__ == "__main__":
 
@@ -186,7 +584,48 @@ if __name__ == "__main__":
         description = "parse files in directory")
     parser.add_argument(
         'directory', help = "directory to be parsed")
+    parser.add_argument(
+        '-j', '--jobs', type = int, default = 1,
+        help = "number of worker processes to parse documents with (0 means one per core)")
+    parser.add_argument(
+        '--lemma-cache', default = "lemmas.pickle", metavar = "FILE",
+        help = "file to load and save the lemma cache in (empty to not keep one)")
+    parser.add_argument(
+        '--lemma-cache-size', type = int, default = 1000000, metavar = "N",
+        help = "maximum number of tokens to remember lemmas for")
+    parser.add_argument(
+        '--stream', action = 'store_true',
+        help = "parse the documents twice rather than holding them all in memory")
+    parser.add_argument(
+        '--doc-cache', default = "parse.cache", metavar = "DIR",
+        help = "directory to cache each document's word counts in (empty to not keep one)")
+    parser.add_argument(
+        '--vocab', metavar = "FILE",
+        help = "vocab.dat of an earlier run, whose word ids should be kept")
+    parser.add_argument(
+        '--min-df', type = int, default = 1, metavar = "N",
+        help = "drop words that occur in fewer than N documents")
+    parser.add_argument(
+        '--max-df', type = float, default = 1.0, metavar = "F",
+        help = "drop words that occur in more than a fraction F of the documents")
+    parser.add_argument(
+        '--max-vocab', type = int, metavar = "N",
+        help = "keep only the N most frequent words")
+    parser.add_argument(
+        '--min-count', type = int, default = 1, metavar = "N",
+        help = "drop words that occur fewer than N times in all")
+    parser.add_argument(
+        '--binary', action = 'store_true',
+        help = "also write abstracts.dat in binary form (see corpus.py)")
+    parser.add_argument(
+        '--by-year', action = 'store_true',
+        help = "make one document of each conference-year")
+    parser.add_argument(
+        '--dedup', type = float, metavar = "SIMILARITY",
+        help = "drop near-duplicate documents, whose shingles have at least this Jaccard similarity (e.g. 0.9)")
     args = parser.parse_args()
+    if args.dedup is not None and not 0 < args.dedup <= 1:
+        parser.error("--dedup SIMILARITY must be more than 0 and at most 1")
 
     d = args.directory
     print "Will work on the following directory: {}".format(args.directory)
@@ -196,6 +635,16 @@ if __name__ == "__main__":
     dat_file = "abstracts.dat"
     vocab_file = "vocab.dat"
     count_file = "count.dat"
-    by_year = False
+    by_year = args.by_year
+    jobs = args.jobs or multiprocessing.cpu_count()
+    lemmas.size = args.lemma_cache_size
+    doc_cache = args.doc_cache
+    binary = args.binary
+    dedup_threshold = args.dedup
+
+    prune = None
+    if (args.min_df, args.max_df, args.max_vocab, args.min_count) != (1, 1.0, None, 1):
+        prune = dict(min_df=args.min_df, max_df=args.max_df,
+                     max_vocab=args.max_vocab, min_count=args.min_count)
  
-    run(d,doc_file,length_file,dat_file,vocab_file,count_file)
+    run(d,doc_file,length_file,dat_file,vocab_file,count_file,jobs,args.lemma_cache,args.stream,args.vocab,prune)
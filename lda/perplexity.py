@@ -0,0 +1,203 @@
+import argparse
+import sys, os
+import re
+import shutil
+import multiprocessing
+import time
+
+import numpy as np
+
+import corpus
+import ldac
+import vem
+import model
+import metadata
+
+# held-out perplexity, for choosing K. first, set aside some of a run's
+# papers:
+#
+#   python perplexity.py split PFX EVAL
+#
+# makes a new run EVAL with the rest of the papers (abstracts.dat,
+# docs.dat and its table, lengths.dat, count.dat, and vocab.dat), and the
+# held-out ones in EVAL/heldout.dat.
+# train EVAL as usual (e.g., with sweep.py), and then score its models:
+#
+#   python perplexity.py score EVAL
+#
+# by document completion: for each held-out paper, we infer its topics
+# from half of its words (picked at random), and see how well those
+# topics predict the other half. the results go in EVAL/perplexity.csv.
+
+def split(d, out, fraction=0.1, seed=None):
+    if not os.path.isdir(out):
+        os.makedirs(out)
+
+    docs = open(os.path.join(d, "docs.dat")).readlines()
+    abstracts = [line for line in open(os.path.join(d, "abstracts.dat")) if line.strip()]
+
+    rng = np.random.RandomState(seed)
+    heldout = rng.random_sample(len(abstracts)) < fraction
+
+    # what parse.py writes alongside, for the papers we keep, so the
+    # reports work on EVAL as on any other run
+    table = model.Run(d).table
+    lengths = os.path.join(d, "lengths.dat")
+    lengths = open(lengths).readlines() if os.path.exists(lengths) else None
+    vocab = open(os.path.join(d, "vocab.dat")).readlines()
+    words = np.zeros(len(vocab))
+
+    files = [open(os.path.join(out, f), "w") for f in
+             ["abstracts.dat", "docs.dat", "heldout.dat", "heldout_docs.dat"]]
+    kept = metadata.TableWriter(os.path.join(out, "docs"))
+    kept_lengths = open(os.path.join(out, "lengths.dat"), "w") if lengths is not None else None
+    for (i, (held, abstract, doc)) in enumerate(zip(heldout, abstracts, docs)):
+        (abstracts_file, docs_file) = files[2:] if held else files[:2]
+        abstracts_file.write(abstract)
+        docs_file.write(doc)
+        if held:
+            continue
+
+        kept.add(table.title(i), table.author_list(i), table.conf(i), table.year(i))
+        if kept_lengths is not None:
+            kept_lengths.write(lengths[i])
+        for entry in abstract.split()[1:]:
+            (term, count) = entry.split(':')
+            words[int(term)] += int(count)
+    for f in files:
+        f.close()
+    kept.close()
+    if kept_lengths is not None:
+        kept_lengths.close()
+
+    # each word's share of the tokens we kept, as in parse.py
+    total = float(max(words.sum(), 1))
+    counts = open(os.path.join(out, "count.dat"), "w")
+    for w in words.tolist():
+        counts.write(str(w / total) + '\n')
+    counts.close()
+
+    shutil.copy(os.path.join(d, "vocab.dat"), out)
+    print "Held out %d of %d papers" % (heldout.sum(), len(abstracts))
+
+def from_tokens(docs, words, num_docs):
+    V = words.max() + 1 if len(words) else 1
+    (keys, counts) = np.unique(docs * V + words, return_counts=True)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(keys / V, minlength=num_docs))])
+    return corpus.Corpus(keys % V, counts, offsets)
+
+# each paper's words, split in two at random
+def halves(data, seed=None):
+    counts = np.asarray(data.counts)
+    words = np.repeat(np.asarray(data.terms, dtype=np.int64), counts)
+    docs = np.repeat(data.doc_ids(), counts)
+
+    observed = np.random.RandomState(seed).random_sample(len(words)) < 0.5
+    return (from_tokens(docs[observed], words[observed], len(data)),
+            from_tokens(docs[~observed], words[~observed], len(data)))
+
+# just the words the model knows; the rest it never saw in training, and
+# can't say anything about
+def known_words(data, log_beta):
+    terms = np.asarray(data.terms)
+    known = np.zeros(len(terms), dtype=bool)
+    inside = terms < log_beta.shape[1]
+    # by word, rather than by entry, so it's never bigger than log_beta
+    known[inside] = (log_beta.max(axis=0) > -100)[terms[inside]]
+
+    docs = data.doc_ids()[known]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(docs, minlength=len(data)))])
+    return corpus.Corpus(terms[known], np.asarray(data.counts)[known], offsets)
+
+def score(model, observed, heldout, settings):
+    (log_beta, alpha) = ldac.read_model(model)
+    observed = known_words(observed, log_beta)
+    heldout = known_words(heldout, log_beta)
+    (gamma, _, _) = vem.infer(observed, log_beta, alpha,
+                              settings['var max iter'], settings['var convergence'])
+    theta = gamma / gamma.sum(axis=1)[:,np.newaxis]
+
+    # p(w | d) = sum_k theta_dk beta_kw, for every held-out word, a batch
+    # of papers at a time as vem.infer goes, so we never have all their
+    # words' topics at once
+    log_p = np.empty(len(heldout.terms))
+    for (start,end) in vem.batches(heldout.offsets, log_beta.shape[0]):
+        (lo,hi) = (heldout.offsets[start], heldout.offsets[end])
+        docs = np.repeat(np.arange(start, end), np.diff(heldout.offsets[start:end+1]))
+        p = np.einsum('nk,kn->n', theta[docs], np.exp(log_beta[:,heldout.terms[lo:hi]]))
+        log_p[lo:hi] = np.log(p)
+    likelihood = (heldout.counts * log_p).sum()
+    tokens = heldout.counts.sum()
+
+    return (likelihood, tokens, np.exp(-likelihood / tokens))
+
+# the held-out papers, split once in the parent, and then inherited by the
+# workers
+shared = {}
+
+def score_k(k):
+    began = time.time()
+    model = os.path.join(shared['d'], "lda%d" % k, "final")
+    (likelihood, tokens, perplexity) = score(model, shared['observed'], shared['heldout'],
+                                             shared['settings'])
+    return (k, perplexity, likelihood, tokens, time.time() - began)
+
+def trained(d):
+    ks = []
+    for f in os.listdir(d):
+        m = re.match(r'lda(\d+)$', f)
+        if m and os.path.exists(os.path.join(d, f, "final.beta")):
+            ks.append(int(m.group(1)))
+    return sorted(ks)
+
+def run(d, ks, settings, jobs=1, seed=None):
+    heldout = corpus.load(os.path.join(d, "heldout.dat"))
+    (shared['observed'], shared['heldout']) = halves(heldout, seed)
+    shared['d'] = d
+    shared['settings'] = settings
+
+    ks = ks or trained(d)
+    if jobs == 1 or len(ks) <= 1:
+        results = map(score_k, ks)
+    else:
+        pool = multiprocessing.Pool(min(jobs, len(ks)))
+        results = pool.map(score_k, ks)
+        pool.close()
+
+    out = open(os.path.join(d, "perplexity.csv"), "w")
+    out.write("K,Perplexity,Log likelihood,Tokens,Seconds\n")
+    for (k, perplexity, likelihood, tokens, seconds) in results:
+        out.write("%d,%f,%f,%d,%.1f\n" % (k, perplexity, likelihood, tokens, seconds))
+        print "lda%d: perplexity %f (%.1fs)" % (k, perplexity, seconds)
+    out.close()
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "held-out perplexity, for choosing the number of topics")
+    sub = parser.add_subparsers(dest = 'mode')
+
+    s = sub.add_parser('split', help = "make a run with some papers held out")
+    s.add_argument('directory', help = "the run to split, e.g. PFX")
+    s.add_argument('out', help = "where to put the new run")
+    s.add_argument('--fraction', type = float, default = 0.1,
+                   help = "how many papers to hold out (default: 0.1)")
+    s.add_argument('--seed', type = int,
+                   help = "random seed (default: different every time)")
+
+    s = sub.add_parser('score', help = "score the models of a split run")
+    s.add_argument('directory', help = "the run, as made by split")
+    s.add_argument('k', type = int, nargs = '*',
+                   help = "which models to score (default: all of them)")
+    s.add_argument('-j', '--jobs', type = int, default = 0,
+                   help = "models to score at once (default: one per core)")
+    s.add_argument('--settings', default = 'settings.txt')
+    s.add_argument('--seed', type = int, default = 0,
+                   help = "random seed for splitting the held-out papers' words (default: 0)")
+
+    args = parser.parse_args()
+
+    if args.mode == 'split':
+        split(args.directory, args.out, args.fraction, args.seed)
+    else:
+        run(args.directory, args.k, ldac.read_settings(args.settings),
+            args.jobs or multiprocessing.cpu_count(), args.seed)
@@ -2,33 +2,39 @@ import codecs
 import re
 import sys
 
+import model
+import chunks
+
 def quote(s):
     return '"' + s + '"'
 
-title = re.compile(u'(.*) \((.*) (\\d*)\)$')
-def split_title(doc):
-    m = title.match(doc)
-    return [m.group(3),quote(m.group(2)),quote(m.group(1))]
+def header(num_topics):
+    return ','.join(["Year","Conference","Title"] +
+                    ["Topic " + str(i) for i in range(0,num_topics)])
 
+# the rows of a block of papers (see chunks.py): topics per document, as
+# LDA-C writes them. the conference and year come from the run's table
+# (see metadata.py), and the title is the docs.dat line without them
+def rows(table, start, docs, gamma):
+    for i,(d,g) in enumerate(zip(docs, gamma.tolist())):
+        (year,conf) = (table.year(start + i),table.conf(start + i))
+        title = d[:len(d) - len(" (" + conf + " " + year + ")")]
+        yield ','.join([year,quote(conf),quote(title)] + ['%5.10f' % v for v in g])
 
-def run(docs,gammas):
+def run(m):
     # show the header
-    num_topics = len(gamma[0].split())
-    print ','.join(["Year","Conference","Title"] +
-                   ["Topic " + str(i) for i in range(0,num_topics)])
+    print header(m.num_topics)
 
-    # topics per document
-    for d,g in zip(docs, gammas):
-        print ','.join(split_title(d) + g.split())
+    table = m.run.table
+    for (start, docs, gamma) in chunks.chunks(m):
+        for row in rows(table, start, docs, gamma):
+            print row
         
 
-def read(f, enc="utf8"):
-    return map(lambda s: s.strip(),codecs.open(f,"r",enc).readlines())
-
 if (__name__ == '__main__'):
     args = dict(enumerate(sys.argv))
-    gamma = read(args.get(1,"final.gamma"))
-    docs = read(args.get(2,"../docs.dat"))
+    gamma = args.get(1,"final.gamma")
+    docs = args.get(2,"../docs.dat")
     by_year = args.get(3,"") == "--by-year"
 
-    run(docs, gamma)
+    run(model.from_files(gamma,docs))
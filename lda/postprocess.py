@@ -0,0 +1,114 @@
+import argparse
+import sys, os
+import codecs
+import multiprocessing
+import time
+
+import model
+import chunks
+import index
+import debug_topics
+import post
+import by_year
+import topic_totals
+
+# all of a model's post-processing at once, reading the model (and the
+# run's docs.dat and vocab.dat) just once for everything:
+#
+#   python postprocess.py PFX [k1 ... kn]
+#
+# makes, for each K, what debug_topics.py, post.py, by_year.py, and
+# topic_totals.py would:
+#
+#   PFX/ldaK_topics.txt     the top words and papers of each topic
+#   PFX/ldaK.csv            each paper's topics
+#   PFX/ldaK_by_year.csv    the topics of each conference, by year
+#   PFX/ldaK_totals.csv     the total weight of each topic
+#
+# and, with --proportions, PFX/ldaK_by_year_proportions.csv: the share of
+# each topic in each conference's year (see by_year.py).
+#
+# the papers are gone through once, a block at a time (see chunks.py):
+# each block's rows of ldaK.csv are written as it comes, and the sums by
+# year, the totals, and the top papers of each topic (for the index; see
+# index.py) are added up from it. the Ks are done --jobs at a time, each
+# in its own process.
+
+# the reports print what they make, so we point stdout at each file in
+# turn
+def write(f, report):
+    out = codecs.open(f, "w", "utf8")
+    stdout = sys.stdout
+    sys.stdout = out
+    try:
+        report()
+    finally:
+        sys.stdout = stdout
+        out.close()
+
+def post_k(job):
+    (d, k, proportions) = job
+    began = time.time()
+    run = model.open_run(d)
+    m = run.model(k)
+    path = lambda f: os.path.join(run.d, f % k)
+
+    # the top papers of each topic, unless the index already has them,
+    # and then just the lines of docs.dat that debug_topics.py shows
+    saved = index.cached(m)
+    if saved is None:
+        top = chunks.TopPapers(index.SIZE)
+    else:
+        top = chunks.Pick(saved.papers[:,:10].ravel().tolist())
+    sums = by_year.Sums(m)
+    totals = chunks.Totals()
+
+    table = run.table
+    csv = codecs.open(path("lda%d.csv"), "w", "utf8")
+    csv.write(post.header(m.num_topics) + u'\n')
+    for (start, docs, gamma) in chunks.chunks(m):
+        for row in post.rows(table, start, docs, gamma):
+            csv.write(row + u'\n')
+        for acc in [top, sums, totals]:
+            acc.add(start, docs, gamma)
+    csv.close()
+
+    if saved is None:
+        saved = index.build(m, index.SIZE, top.result())
+        index.save(m, saved)
+    m.index = saved
+
+    write(path("lda%d_topics.txt"), lambda: debug_topics.run(m, 10, top.docs))
+    write(path("lda%d_by_year.csv"), lambda: by_year.report(sums))
+    write(path("lda%d_totals.csv"), lambda: topic_totals.report(totals.total))
+    if proportions:
+        write(path("lda%d_by_year_proportions.csv"),
+              lambda: by_year.report(sums, proportions=True))
+    return (k, time.time() - began)
+
+def run(d, ks, jobs=1, proportions=False):
+    ks = ks or model.open_run(d).ks()
+    todo = [(d, k, proportions) for k in ks]
+    if jobs == 1 or len(ks) <= 1:
+        results = map(post_k, todo)
+    else:
+        pool = multiprocessing.Pool(min(jobs, len(ks)))
+        results = pool.map(post_k, todo)
+        pool.close()
+
+    for (k, seconds) in results:
+        print "lda%d: done in %.1fs" % (k, seconds)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "make the topics, CSV, by-year, and totals reports of a run's models")
+    parser.add_argument('directory', help = "the run, e.g. PFX")
+    parser.add_argument('k', type = int, nargs = '*',
+                        help = "which models to do (default: all of them)")
+    parser.add_argument('-j', '--jobs', type = int, default = 1,
+                        help = "models to do at once (0 for one per core; default: 1)")
+    parser.add_argument('--proportions', action = 'store_true',
+                        help = "also make ldaK_by_year_proportions.csv")
+    args = parser.parse_args()
+
+    run(args.directory, args.k, args.jobs or multiprocessing.cpu_count(), args.proportions)
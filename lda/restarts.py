@@ -0,0 +1,154 @@
+import argparse
+import sys, os
+import shutil
+import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import codecs
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+import corpus
+import ldac
+import vem
+
+# trains the same K several times from different random starts, to see
+# which topics come out the same every time and which don't:
+#
+#   python restarts.py PFX 100 --restarts 5
+#
+# the restarts go in PFX/lda100_restarts/rN, all trained at once (as
+# many as there are cores). the one with the best likelihood is the one
+# we keep, and is copied to PFX/lda100 as usual. we match each of its
+# topics with the most similar topic of each of the other restarts,
+# pairing them off so that the total similarity is as high as it can be
+# (the Hungarian algorithm), and call the average similarity of a topic
+# to its matches its stability. these go in PFX/lda100_stability.csv.
+#
+# similarity is the Bhattacharyya coefficient of the two topics' word
+# distributions: 1 when they're the same, 0 when they share no words.
+
+def restart_dirs(d, k, n):
+    return [os.path.join(d, "lda%d_restarts" % k, "r%d" % i) for i in range(n)]
+
+# LDA-C seeds its random starts with the time, so restarts started
+# together would all be the same; we make each one's start ourselves
+def write_start(data, k, alpha, prefix, seed):
+    (log_beta, _) = vem.initial_model(data, k, "seeded", np.random.RandomState(seed))
+    ldac.write_model(prefix, log_beta, alpha)
+
+def train(job):
+    (argv, log) = job
+    out = open(log, "a")
+    code = subprocess.call(argv, stdout=out, stderr=out)
+    out.close()
+    return code
+
+def final_likelihood(d):
+    lines = open(os.path.join(d, "likelihood.dat")).readlines()
+    return float(lines[-1].split()[0])
+
+def similarities(log_beta1, log_beta2):
+    return np.dot(np.exp(0.5 * log_beta1), np.exp(0.5 * log_beta2).T)
+
+# for each topic of reference, the topic of other it's paired with, and
+# how similar they are
+def align(reference, other):
+    V = min(reference.shape[1], other.shape[1])
+    sim = similarities(reference[:,:V], other[:,:V])
+    (rows, cols) = linear_sum_assignment(-sim)
+    return (cols, sim[rows, cols])
+
+def run(d, k, n, cores, engine='lda', settings='settings.txt', alpha='1/50', seed=0):
+    data_file = os.path.join(d, "abstracts.dat")
+    dirs = restart_dirs(d, k, n)
+
+    jobs = []
+    data = None
+    for (i,r) in enumerate(dirs):
+        if os.path.exists(os.path.join(r, "final.beta")):
+            continue
+        if not os.path.isdir(r):
+            os.makedirs(r)
+
+        start = os.path.join(r, "start")
+        if not os.path.exists(start + ".beta"):
+            if data is None:
+                data = corpus.load(data_file)
+            write_start(data, k, ldac.atof(alpha), start, seed + i)
+
+        argv = [sys.executable, 'train.py', '--engine', engine, '--resume',
+                alpha, str(k), settings, data_file, start, r]
+        jobs.append((argv, r + ".log"))
+
+    print "Training %d restarts of lda%d (%d already done)" % (len(jobs), k, n - len(jobs))
+    pool = ThreadPool(cores)
+    codes = pool.map(train, jobs)
+    pool.close()
+
+    failed = [argv[-1] for ((argv, log), code) in zip(jobs, codes) if code != 0]
+    for r in failed:
+        print "Training %s failed; see %s.log" % (r, r)
+    dirs = [r for r in dirs if r not in failed]
+    if not dirs:
+        return
+
+    likelihoods = [final_likelihood(r) for r in dirs]
+    best = int(np.argmax(likelihoods))
+    print "Best: %s (likelihood %f)" % (dirs[best], likelihoods[best])
+
+    canonical = os.path.join(d, "lda%d" % k)
+    if not os.path.isdir(canonical):
+        os.makedirs(canonical)
+    for f in os.listdir(dirs[best]):
+        if f.startswith("final.") or f in ["likelihood.dat", "word-assignments.dat"]:
+            shutil.copy(os.path.join(dirs[best], f), canonical)
+
+    (reference, _) = ldac.read_model(os.path.join(dirs[best], "final"))
+    others = [r for r in dirs if r != dirs[best]]
+    matches = []
+    scores = []
+    for r in others:
+        (match, score) = align(reference, ldac.read_model(os.path.join(r, "final"))[0])
+        matches.append(match)
+        scores.append(score)
+    stability = np.mean(scores, axis=0) if scores else np.ones(k)
+
+    vocab = [w.strip() for w in codecs.open(os.path.join(d, "vocab.dat"), "r", "utf8")]
+    out = codecs.open(os.path.join(d, "lda%d_stability.csv" % k), "w", "utf8")
+    out.write(','.join(["Topic", "Stability", "Words"] +
+                       ["Match in " + os.path.basename(r) for r in others]) + "\n")
+    for t in range(k):
+        words = ' '.join(vocab[w] for w in np.argsort(-reference[t])[:5] if w < len(vocab))
+        out.write(','.join([str(t), "%f" % stability[t], '"' + words + '"'] +
+                           [str(m[t]) for m in matches]) + "\n")
+    out.close()
+
+    print "Mean stability %f; least stable topics: %s" % \
+        (stability.mean(), ' '.join("%d (%.2f)" % (t, stability[t])
+                                    for t in np.argsort(stability)[:5]))
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "train K several times and see which topics are stable")
+    parser.add_argument('directory', help = "the run, e.g. PFX")
+    parser.add_argument('k', type = int, help = "number of topics")
+    parser.add_argument(
+        '-n', '--restarts', type = int, default = 5,
+        help = "how many times to train it (default: 5)")
+    parser.add_argument(
+        '-j', '--cores', type = int, default = 0,
+        help = "most restarts to train at once (default: one per core)")
+    parser.add_argument(
+        '--engine', choices = ['lda', 'vem', 'gibbs'], default = 'lda',
+        help = "what to train with (default: LDA-C)")
+    parser.add_argument('--settings', default = 'settings.txt')
+    parser.add_argument('--alpha', default = '1/50')
+    parser.add_argument(
+        '--seed', type = int, default = 0,
+        help = "random seed for the first restart's start; the others use the next ones (default: 0)")
+    args = parser.parse_args()
+
+    run(args.directory, args.k, args.restarts, args.cores or multiprocessing.cpu_count(),
+        args.engine, args.settings, args.alpha, args.seed)
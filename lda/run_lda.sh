@@ -2,9 +2,26 @@
 
 export PYTHONIOENCODING=utf8
 
+EXTRACT=no
+while [ $# -gt 0 ] ;
+do
+    case "$1" in
+        --by-year)
+            # train on one document per conference-year, rather than per paper
+            PARSE_OPTS="${PARSE_OPTS} --by-year"
+            shift 1;;
+        --extract)
+            # extract the text of any new PDFs before parsing
+            EXTRACT=yes
+            shift 1;;
+        *)
+            break;;
+    esac
+done
+
 if [ $# -lt 1 ] ;
 then
-    echo Usage: ${0##*/} input_dir [k1 ... kn]
+    echo Usage: ${0##*/} [--by-year] [--extract] input_dir [k1 ... kn]
     exit 1
 else
     src=$1
@@ -24,13 +41,27 @@ START=`date "+%Y-%m-%d %H:%M"`
 echo "SETTING UP"
 mkdir ${DIR}
 
+if [ ${EXTRACT} = yes ]; then
+    echo "EXTRACTING FULLTEXT"
+    python extract.py --jobs 0 ${src}
+fi
+
 echo "PARSING"
-python parse.py ${src}
+python parse.py ${PARSE_OPTS} ${src}
 
 for dat in abstracts.dat vocab.dat count.dat docs.dat lengths.dat; do
     mv ${dat} ${DIR}
 done
 
+for table in titles title_offsets authors author_offsets confs years names; do
+    mv docs.${table} ${DIR}
+done
+
+# the binary corpus and duplicate report, if we asked for them
+for extra in abstracts.terms abstracts.counts abstracts.offsets duplicates.txt; do
+    test -e ${extra} && mv ${extra} ${DIR}
+done
+
 if [ ! -s ${DIR}/abstracts.dat ]; then
     echo PARSING PRODUCED AN EMPTY FILE, ABORTING
     exit 1
@@ -41,26 +72,27 @@ cp stopwords.dat ${DIR}
 
 echo "RUNNING LDA"
 
-ABS=${DIR}/abstracts.dat
-
+# trains each K (biggest first, a core at a time) and post-processes it
+# as soon as it's done; see sweep.py
 for k in ${KS}; do
-    lda est 1/50 ${k} settings.txt ${ABS} seeded ${DIR}/lda${k} &
     echo lda${k} >>${DIR}/.gitignore
+    echo lda${k}.log >>${DIR}/.gitignore
 done
 
-wait
-echo "PROCESSING TOPICS"
-
-for k in ${KS}; do
-    python debug_topics.py ${DIR} ${k} > ${DIR}/lda${k}_topics.txt
-done
+# follow the training, and stop Ks that level off, if asked
+if [ -n "${MONITOR_OPTS}" ]; then
+    python monitor.py ${MONITOR_OPTS} ${DIR} ${KS} > ${DIR}/monitor.log &
+    MONITOR=$!
+fi
 
-echo "GENERATING CSV"
+python sweep.py ${SWEEP_OPTS} ${DIR} ${KS} || echo SOME RUNS FAILED, SEE ${DIR}/sweep.json
 
-for i in ${DIR}/lda*; do
-    test -d ${i} && python post.py ${i}/final.gamma ${DIR}/docs.dat > ${i}.csv
-    test -d ${i} && python by_year.py ${i}/final.gamma ${DIR}/docs.dat > ${i}_by_year.csv
-done
+# the monitor finishes once every K has, but don't leave it behind if
+# it's still looking when the sweep is over
+if [ -n "${MONITOR}" ]; then
+    kill ${MONITOR} 2>/dev/null
+    wait ${MONITOR} 2>/dev/null
+fi
 
 echo "MOVING TO OUTPUT DIRECTORY"
 mv ${DIR} ../out
@@ -1,39 +1,38 @@
-from utils import *
+import numpy as np
 
-def run(docs,gammas,query,num):
-    papers = zip(docs,map(lambda s: map(float,s.split()), gammas))
+from utils import *
+import model
 
-    tgt = filter(lambda (t,gs): query in t.lower(), papers)
+def run(m,query,num):
+    (docs,gammas,table) = (m.docs,m.gamma,m.run.table)
+    tgt = filter(lambda i: query in table.title(i).lower(), range(len(table)))
 
     if len(tgt) == 0:
         print "Couldn't find a paper matching " + query
         sys.exit(-1)
     elif len(tgt) > 1:
         print "Found too many papers:"
-        for (title,gs) in tgt:
-            print '  %s' % title
+        for i in tgt:
+            print '  %s' % docs[i]
         sys.exit(-1)
 
     tgt = tgt[0]
-    papers = map(lambda s: (distance(s[1],tgt[1]),s), papers)
-    papers.sort(lambda x,y: cmp(x[0],y[0]))
+    gammas = np.asarray(gammas, dtype=np.float64)
+    distances = np.sqrt(((gammas - gammas[tgt]) ** 2).sum(axis=1))
+    papers = np.argsort(distances, kind='mergesort')
 
-    if papers[0][1] != tgt:
+    if papers[0] != tgt:
         print ">>> Huh, would have expected the first paper to be the one we queried."
-        print '%s (%d)' % (papers[0][1][0],papers[0][0])
+        print '%s (%d)' % (docs[papers[0]],distances[papers[0]])
 
-    for (d,(doc,gs)) in papers[1:num+1]:
-        print '%s (%d)' % (doc,d)   
+    for p in papers[1:num+1]:
+        print '%s (%d)' % (docs[p],distances[p])
 
 if (__name__ == '__main__'):
     args = dict(enumerate(sys.argv))
     query = args.get(1,"BI as an Assertion Language for Mutable Data Structures").lower()
     num = int(args.get(2,10))
     prefix = args.get(3,"2015-01-06_11:06")
-    k = args.get(4,"20")
-    
-    lda = prefix + "_lda" + k
-    gamma = read(os.path.join(lda,"final.gamma"))
-    docs = read(prefix + "_docs.dat")
+    k = int(args.get(4,20))
 
-    run(docs,gamma,query,num)
+    run(model.open_model(prefix,k),query,num)
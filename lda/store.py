@@ -0,0 +1,121 @@
+import argparse
+import sys, os
+import re
+import tempfile
+
+import numpy as np
+
+# LDA-C writes its models as text (final.beta and final.gamma), which is
+# slow to read: 200 topics of 250,000 words is 50 million numbers to
+# parse, every time we look at a model. so once a model is done, we keep
+# a binary copy of each (final.beta.npy and final.gamma.npy, as 64-bit
+# floats, so they hold exactly the numbers of the text, and the reports
+# come out the same from either) next to the text:
+#
+#   python store.py PFX [k1 ... kn]
+#
+# load_beta and load_gamma memory-map the binary copy when there is one,
+# and read the text when there isn't (or when the text is newer, e.g.,
+# because the model was trained again).
+#
+# the copies used to be 32-bit, at half the size, but the reports came
+# out differently from them. at 64 bits they save the parsing, not the
+# memory: whatever part of a model we touch takes 8 bytes a number,
+# just as when it's read from the text.
+
+model_dir = re.compile(r'lda\d+$')
+
+def binary_file(f):
+    return f + ".npy"
+
+# copies made before we kept them at 64 bits are as good as stale, as long
+# as there's the text to read instead
+def fresh(f):
+    b = binary_file(f)
+    if not os.path.exists(b):
+        return False
+    if not os.path.exists(f):
+        return True
+    return os.path.getmtime(b) >= os.path.getmtime(f) and \
+        np.load(b, mmap_mode='r').dtype == np.float64
+
+def read_text(f, dtype=np.float64):
+    rows = [np.fromstring(line, dtype=dtype, sep=' ') for line in open(f) if line.strip()]
+    if not rows:
+        return np.zeros((0, 0), dtype=dtype)
+    return np.vstack(rows)
+
+def load(f):
+    if fresh(f):
+        return np.load(binary_file(f), mmap_mode='r')
+    return read_text(f)
+
+# a model's log topic-word weights (K x V), e.g., load_beta("PFX/lda200/final")
+def load_beta(model):
+    return load(model + ".beta")
+
+# and its topic weights for every paper (D x K)
+def load_gamma(model):
+    return load(model + ".gamma")
+
+def shape(f):
+    (rows, cols) = (0, None)
+    for line in open(f):
+        if line.strip():
+            if cols is None:
+                cols = len(line.split())
+            rows += 1
+    return (rows, cols or 0)
+
+# a line at a time, so the whole text never has to be in memory at once
+def convert(f):
+    (rows, cols) = shape(f)
+
+    fd,tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(f)))
+    os.close(fd)
+    out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=(rows, cols))
+    i = 0
+    for line in open(f):
+        if line.strip():
+            out[i] = np.fromstring(line, dtype=np.float64, sep=' ')
+            i += 1
+    out.flush()
+    del out
+    os.rename(tmp, binary_file(f))
+
+    return (rows, cols)
+
+def models(d, ks):
+    if ks:
+        return [os.path.join(d, "lda%d" % k) for k in ks]
+    if model_dir.match(os.path.basename(os.path.normpath(d))):
+        return [d]
+    return [os.path.join(d, f) for f in sorted(os.listdir(d))
+            if model_dir.match(f) and os.path.exists(os.path.join(d, f, "final.gamma"))]
+
+def run(d, ks, force=False):
+    for m in models(d, ks):
+        name = os.path.basename(os.path.normpath(m))
+        for f in ["final.beta", "final.gamma"]:
+            f = os.path.join(m, f)
+            if not os.path.exists(f):
+                print "%s: no %s" % (name, os.path.basename(f))
+            elif fresh(f) and not force:
+                print "%s: %s is already converted" % (name, os.path.basename(f))
+            else:
+                (rows, cols) = convert(f)
+                print "%s: %s is %d x %d (%.1f MB)" % \
+                    (name, os.path.basename(f), rows, cols,
+                     os.path.getsize(binary_file(f)) / 1e6)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "keep binary copies of models, which are much quicker to load")
+    parser.add_argument('directory', help = "a run (e.g. PFX) or one model (e.g. PFX/lda200)")
+    parser.add_argument('k', type = int, nargs = '*',
+                        help = "which models of the run to convert (default: all of them)")
+    parser.add_argument('--force', action = 'store_true',
+                        help = "convert them even if they already have been")
+    args = parser.parse_args()
+
+    run(args.directory, args.k, args.force)
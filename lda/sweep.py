@@ -0,0 +1,227 @@
+import argparse
+import sys, os
+import json
+import tempfile
+import subprocess
+import multiprocessing
+import time
+
+# runs the training for every K of a run, and the post-processing of each
+# K as soon as it's done, without running more at once than the machine
+# can take.
+#
+# the biggest Ks take longest, so they go first. we only start a job when
+# there's a core free for it and (by a rough estimate of what LDA-C
+# allocates) enough memory; a job runs regardless if nothing else is.
+# each job logs to PFX/ldaK.log, and how every K went is kept in
+# PFX/sweep.json, so running the sweep again only reruns the Ks that
+# failed or never finished; a K that failed partway through carries on
+# from its last checkpoint (see train.py).
+
+# not gibbs.py: it samples one token at a time in plain python, which is
+# far too slow for a whole sweep's worth of Ks
+engines = ['lda', 'vem', 'online']
+
+def count_lines(f):
+    return sum(1 for line in open(f))
+
+def physical_memory():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+# in bytes: beta and its sufficient statistics (K x V), and gamma (D x K)
+def memory_needed(k, num_terms, num_docs):
+    return 8 * k * (2 * num_terms + num_docs)
+
+# always with --resume, so a K that's rerun picks up from its last
+# checkpoint
+def train_command(engine, k, d, settings, alpha, warm=None):
+    warm_start = ['--warm-start', os.path.join(d, "lda%d" % warm, "final")] if warm else []
+    return [sys.executable, 'train.py', '--engine', engine, '--resume'] + warm_start + \
+        [alpha, str(k), settings, os.path.join(d, "abstracts.dat"), "seeded",
+         os.path.join(d, "lda%d" % k)]
+
+# each step of the post-processing, and where its output goes
+def post_commands(k, d):
+    lda = os.path.join(d, "lda%d" % k)
+    python = sys.executable
+
+    return [([python, 'store.py', lda], None),
+            ([python, 'postprocess.py', d, str(k)], None)]
+
+def load_status(f):
+    if not os.path.exists(f):
+        return {}
+    return json.load(open(f))
+
+def save_status(f, status):
+    fd,tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(f)))
+    out = os.fdopen(fd,"w")
+    json.dump(status, out, indent=1, sort_keys=True)
+    out.close()
+    os.rename(tmp, f)
+
+# a chain of commands, run one after the other so long as they succeed
+class Job(object):
+    def __init__(self, k, kind, steps, log, memory=0):
+        self.k = k
+        self.kind = kind
+        self.steps = list(steps)
+        self.log = log
+        self.memory = memory
+        self.process = None
+        self.returncode = None
+
+    def start(self):
+        self.started = time.time()
+        self.next_step()
+
+    def next_step(self):
+        (argv, out) = self.steps.pop(0)
+        log = open(self.log, "a")
+        stdout = log if out is None else open(out, "w")
+        try:
+            self.process = subprocess.Popen(argv, stdout=stdout, stderr=log)
+        except OSError as e:
+            # e.g., LDA-C isn't installed; fail as the shell would
+            log.write("%s: %s\n" % (argv[0], e.strerror))
+            self.process = None
+        stdout.close()
+        if stdout is not log:
+            log.close()
+
+    # None while we're still running
+    def poll(self):
+        code = 127 if self.process is None else self.process.poll()
+        if code is None:
+            return None
+        if code == 0 and self.steps:
+            self.next_step()
+            return None
+
+        self.returncode = code
+        return code
+
+def run(d, ks, cores, memory, engine='lda', settings='settings.txt', alpha='1/50',
+        retries=1, post=True, warm=False):
+    status_file = os.path.join(d, "sweep.json")
+    status = load_status(status_file)
+
+    num_terms = count_lines(os.path.join(d, "vocab.dat"))
+    num_docs = count_lines(os.path.join(d, "abstracts.dat"))
+
+    # when warm-starting, each K starts from the next smaller one, so the
+    # smallest goes first
+    ks = sorted(set(ks), reverse=not warm)
+    smaller = dict(zip(sorted(ks)[1:], sorted(ks))) if warm else {}
+
+    def train_job(k):
+        return Job(k, 'train', [], os.path.join(d, "lda%d.log" % k),
+                   memory_needed(k, num_terms, num_docs))
+
+    pending = []
+    for k in ks:
+        s = status.get(str(k), {})
+        if s.get('train') == 'done' and (not post or s.get('post') == 'done'):
+            print "lda%d: already done" % k
+            continue
+
+        status[str(k)] = {'train': s.get('train', 'pending'), 'post': 'pending', 'attempts': 0}
+        if s.get('train') == 'done':
+            # only the post-processing left to do
+            pending.append(Job(k, 'post', post_commands(k, d), os.path.join(d, "lda%d.log" % k)))
+        else:
+            pending.append(train_job(k))
+    save_status(status_file, status)
+
+    running = []
+    while pending or running:
+        # start whatever fits, in order
+        for job in list(pending):
+            in_use = sum(j.memory for j in running)
+            if running and (len(running) >= cores or in_use + job.memory > memory):
+                continue
+
+            if job.kind == 'train':
+                # wait for the K we're warm-starting from; if it failed,
+                # start from scratch
+                after = smaller.get(job.k)
+                if any(j.k == after and j.kind == 'train' for j in pending + running):
+                    continue
+                if after is not None and status.get(str(after), {}).get('train') != 'done':
+                    after = None
+                job.steps = [(train_command(engine, job.k, d, settings, alpha, after), None)]
+
+            pending.remove(job)
+            running.append(job)
+            job.start()
+            s = status[str(job.k)]
+            s[job.kind] = 'running'
+            if job.kind == 'train':
+                s['attempts'] += 1
+            print "lda%d: started %s" % (job.k, "training" if job.kind == 'train' else "post-processing")
+        save_status(status_file, status)
+
+        time.sleep(1)
+
+        for job in list(running):
+            code = job.poll()
+            if code is None:
+                continue
+
+            running.remove(job)
+            s = status[str(job.k)]
+            s[job.kind] = 'done' if code == 0 else 'failed'
+            s[job.kind + ' exit'] = code
+            s[job.kind + ' seconds'] = round(time.time() - job.started, 1)
+            print "lda%d: %s %s (exit status %d, %.0fs)" % \
+                (job.k, job.kind, s[job.kind], code, s[job.kind + ' seconds'])
+
+            if job.kind == 'train' and code == 0 and post:
+                # post-processing is cheap; get it going right away
+                pending.insert(0, Job(job.k, 'post', post_commands(job.k, d), job.log))
+            elif job.kind == 'train' and code != 0 and s['attempts'] <= retries:
+                print "lda%d: retrying; see %s" % (job.k, job.log)
+                s['train'] = 'retrying'
+                pending.append(train_job(job.k))
+                pending.sort(key=lambda j: ks.index(j.k))
+        save_status(status_file, status)
+
+    failed = [k for k in sorted(status, key=int)
+              if 'failed' in (status[k]['train'], status[k]['post'])]
+    if failed:
+        print "FAILED: " + ' '.join("lda" + k for k in failed)
+    return failed
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "train and post-process every K of a run, a few at a time")
+    parser.add_argument('directory', help = "the run, e.g. PFX")
+    parser.add_argument('k', type = int, nargs = '+', help = "numbers of topics")
+    parser.add_argument(
+        '-j', '--cores', type = int, default = 0,
+        help = "most jobs to run at once (default: one per core)")
+    parser.add_argument(
+        '--memory', type = int, default = 0, metavar = "MB",
+        help = "memory to keep the jobs within (default: all of it)")
+    parser.add_argument(
+        '--engine', choices = sorted(engines), default = 'lda',
+        help = "what to train with (default: LDA-C)")
+    parser.add_argument('--settings', default = 'settings.txt')
+    parser.add_argument('--alpha', default = '1/50')
+    parser.add_argument(
+        '--retries', type = int, default = 1,
+        help = "how many times to rerun a K that fails (default: 1)")
+    parser.add_argument(
+        '--warm-start', action = 'store_true',
+        help = "start each K from the next smaller one's model (one K at a time)")
+    parser.add_argument(
+        '--no-post', dest = 'post', action = 'store_false',
+        help = "just train; don't make ldaK_topics.txt, ldaK.csv, ldaK_by_year.csv, or ldaK_totals.csv")
+    args = parser.parse_args()
+
+    cores = args.cores or multiprocessing.cpu_count()
+    memory = args.memory * 1024 * 1024 or physical_memory()
+
+    failed = run(args.directory, args.k, cores, memory, args.engine, args.settings,
+                 args.alpha, args.retries, args.post, args.warm_start)
+    sys.exit(1 if failed else 0)
@@ -10,25 +10,24 @@
 
 import sys
 
+import model
+import index
+
 def print_topics(beta_file, vocab_file, nwords = 25):
 
-    # get the vocabulary
+    # the model's top words, from its index if it has one (see index.py),
+    # or else from beta alone
 
-    vocab = file(vocab_file, 'r').readlines()
-    # vocab = map(lambda x: x.split()[0], vocab)
-    vocab = map(lambda x: x.strip(), vocab)
+    m = model.from_files(beta_file, vocab_file = vocab_file)
+    vocab = m.vocab
+    words = index.top_words(m, nwords)
 
-    # for each line in the beta file
+    # for each topic
 
-    topic_no = 0
-    for topic in file(beta_file, 'r'):
+    for topic_no in range(words.shape[0]):
         print 'topic %03d' % topic_no
-        topic = map(float, topic.split())
-        indices = range(len(topic))
-        indices.sort(lambda x,y: -cmp(topic[x], topic[y]))
-        for i in range(nwords):
-            print '   %s' % vocab[indices[i]]
-        topic_no = topic_no + 1
+        for i in words[topic_no]:
+            print '   %s' % vocab[i]
         print '\n'
 
 if (__name__ == '__main__'):
@@ -0,0 +1,203 @@
+import argparse
+import sys, os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+import corpus
+import ldac
+import vem
+import checkpoint
+
+# trains a model with LDA-C or one of our own engines, so that a run
+# that's killed can be picked up again with --resume:
+#
+#   python train.py --resume 1/50 200 settings.txt PFX/abstracts.dat seeded PFX/lda200
+#
+# our own engines checkpoint themselves. LDA-C saves its model every few
+# iterations (as NNN.beta, NNN.other, and NNN.gamma), but has no notion of
+# resuming; it can only start from a saved model, and then counts from
+# zero again. so we start it from the latest saved model, in a new
+# directory (PFX/ldaK/resume-NNN, where NNN is the iteration it starts
+# from) so it doesn't overwrite the models it's counting from, and with
+# however many iterations are left. its likelihoods are copied into
+# PFX/ldaK/likelihood.dat as it goes, and its final model into PFX/ldaK
+# when it's done, so it looks as if it had never stopped.
+#
+# --warm-start PFX/lda50/final starts a larger K from a smaller model:
+# its topics, plus new ones seeded from random papers, as LDA-C does.
+
+scripts = {'vem': 'vem.py', 'gibbs': 'gibbs.py', 'online': 'online.py'}
+
+# the most recent model LDA-C saved, and the iteration after which it did
+def latest_model(d):
+    saved = [int(f[:3]) for f in os.listdir(d)
+             if len(f) == 9 and f[:3].isdigit() and f.endswith(".gamma")]
+    return max(saved) if saved else None
+
+def write_settings(f, settings_file, em_max_iter):
+    out = open(f, "w")
+    for line in open(settings_file):
+        if line.startswith("em max iter "):
+            line = "em max iter %d\n" % em_max_iter
+        out.write(line)
+    out.close()
+
+# runs LDA-C into segment, copying its likelihoods into d if that's
+# somewhere else. if we're asked to stop (see monitor.py), we stop it and
+# use the last model it saved
+def run_lda(argv, segment, d):
+    process = subprocess.Popen(argv)
+
+    pos = 0
+    while True:
+        code = process.poll()
+        if segment != d:
+            (text, pos) = checkpoint.read_lines(os.path.join(segment, "likelihood.dat"), pos)
+            if text:
+                out = open(os.path.join(d, "likelihood.dat"), "a")
+                out.write(text)
+                out.close()
+        if code is not None:
+            return code
+
+        n = latest_model(segment)
+        if checkpoint.stop_requested(d) and n is not None:
+            print "stopping early: " + checkpoint.take_stop(d)
+            process.terminate()
+            process.wait()
+
+            prefix = os.path.join(segment, "%03d" % n)
+            for ext in [".beta", ".other", ".gamma"]:
+                shutil.copy(prefix + ext, os.path.join(d, "final" + ext))
+            return 0
+
+        time.sleep(1)
+
+def copy_final(segment, d):
+    for f in os.listdir(segment):
+        if f.startswith("final.") or f == "word-assignments.dat":
+            shutil.copy(os.path.join(segment, f), d)
+
+def train_lda(alpha, k, settings_file, data, start, d, resume, lda='lda'):
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    checkpoint.clear_stop(d)
+
+    saved = checkpoint.load(d) if resume else None
+    if saved is not None and saved['engine'] == 'lda':
+        if os.path.exists(os.path.join(d, "final.gamma")):
+            print "%s is already done" % d
+            return 0
+
+        (segment, offset, start) = (saved['segment'], saved['offset'], saved['start'])
+        if os.path.exists(os.path.join(segment, "final.gamma")):
+            # it finished, but we didn't get to copy its model
+            copy_final(segment, d)
+            return 0
+
+        n = latest_model(segment)
+        if n is not None:
+            (offset, start) = (offset + n, os.path.join(segment, "%03d" % n))
+
+        # LDA-C does em max iter + 1 iterations (its loop goes on while
+        # i <= EM_MAX_ITER, and counts i from 0), so a segment given em max
+        # iter N does N + 1 of those left
+        em_max_iter = ldac.read_settings(settings_file)['em max iter']
+        left = em_max_iter + 1 - offset
+        if offset > 0 and left <= 0:
+            # it had done them all, and only had the final model to write
+            print "%s already did all %d iterations" % (d, offset)
+            for ext in [".beta", ".other", ".gamma"]:
+                shutil.copy(start + ext, os.path.join(d, "final" + ext))
+            return 0
+
+        if offset > 0:
+            print "resuming from iteration %d" % offset
+            segment = os.path.join(d, "resume-%03d" % offset)
+            if not os.path.isdir(segment):
+                os.makedirs(segment)
+
+            segment_settings = os.path.join(segment, "settings.txt")
+            write_settings(segment_settings, settings_file, left - 1)
+
+            checkpoint.save(d, engine='lda', segment=segment, offset=offset, start=start)
+            checkpoint.truncate_likelihoods(d, offset)
+
+            code = run_lda([lda, 'est', alpha, str(k), segment_settings, data, start, segment],
+                           segment, d)
+            if code == 0:
+                copy_final(segment, d)
+            return code
+
+    checkpoint.save(d, engine='lda', segment=d, offset=0, start=start)
+    return run_lda([lda, 'est', alpha, str(k), settings_file, data, start, d], d, d)
+
+# a model with k topics: those of a smaller one, and more seeded from
+# random documents
+def warm_model(small, k, data_file, prefix, seed=None):
+    (log_beta, alpha) = ldac.read_model(small)
+    if k <= log_beta.shape[0]:
+        raise ValueError("%s already has %d topics" % (small, log_beta.shape[0]))
+
+    data = corpus.load(data_file)
+    rng = np.random.RandomState(seed)
+    (more, _) = vem.initial_model(data, k - log_beta.shape[0], "seeded", rng)
+
+    V = max(log_beta.shape[1], more.shape[1])
+    model = np.empty((k, V))
+    model.fill(-100.0)
+    model[:log_beta.shape[0],:log_beta.shape[1]] = log_beta
+    model[log_beta.shape[0]:,:more.shape[1]] = more
+
+    ldac.write_model(prefix, model, alpha)
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "train a model, with checkpoints to resume from",
+        epilog = "any other options (written --option=value) are passed on to the engine")
+    parser.add_argument(
+        '--engine', choices = ['lda'] + sorted(scripts), default = 'lda',
+        help = "what to train with (default: LDA-C)")
+    parser.add_argument(
+        '--resume', action = 'store_true',
+        help = "carry on from the last checkpoint in the directory, if there is one")
+    parser.add_argument(
+        '--warm-start', metavar = "MODEL",
+        help = "start from the topics of a smaller model (e.g. PFX/lda50/final)")
+    parser.add_argument('--seed', type = int, help = "random seed (default: different every time)")
+    parser.add_argument('--lda', default = 'lda', help = "the LDA-C binary")
+    parser.add_argument('alpha')
+    parser.add_argument('k', type = int)
+    parser.add_argument('settings')
+    parser.add_argument('data')
+    parser.add_argument('start', help = "seeded, random, or a saved model (e.g. PFX/lda50/final)")
+    parser.add_argument('directory')
+    (args, extra) = parser.parse_known_args()
+
+    start = args.start
+    if args.warm_start:
+        if args.engine == 'online':
+            parser.error("online.py can only start from its own models")
+
+        if not os.path.isdir(args.directory):
+            os.makedirs(args.directory)
+        start = os.path.join(args.directory, "warm")
+        if not (args.resume and os.path.exists(start + ".beta")):
+            warm_model(args.warm_start, args.k, args.data, start, args.seed)
+
+    if args.engine == 'lda':
+        code = train_lda(args.alpha, args.k, args.settings, args.data, start,
+                         args.directory, args.resume, args.lda)
+    else:
+        argv = [sys.executable, scripts[args.engine], 'est'] + extra
+        if args.resume:
+            argv.append('--resume')
+        if args.seed is not None:
+            argv += ['--seed', str(args.seed)]
+        code = subprocess.call(argv + [args.alpha, str(args.k), args.settings, args.data,
+                                       start, args.directory])
+
+    sys.exit(code)
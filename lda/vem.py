@@ -0,0 +1,386 @@
+import argparse
+import sys, os
+import time
+import multiprocessing
+
+import numpy as np
+from scipy.special import gammaln, psi, polygamma
+import scipy.sparse
+
+import corpus
+import ldac
+import checkpoint
+
+# variational EM for LDA, as in LDA-C (Blei, Ng, and Jordan 2003), but
+# with the E-step done for a whole batch of documents at once in numpy.
+# it reads and writes the same files as `lda est`:
+#
+#   python vem.py est 1/50 50 settings.txt PFX/abstracts.dat seeded PFX/lda50
+#
+# unlike LDA-C, which updates each word's topic assignment in turn, we
+# update the assignments of every word in a batch together; the fixed
+# points are the same, but the path there (and so the result) isn't
+# exactly what LDA-C would get.
+
+LAG = 5                 # save the model every LAG iterations, as LDA-C does
+NEWTON_THRESH = 1e-5
+MAX_ALPHA_ITER = 1000
+NUM_INIT = 1            # documents to seed each topic with
+
+# how many (word, topic) entries to work on at once in the E-step
+batch_entries = 1 << 24
+
+def batches(offsets, num_topics, entries=batch_entries):
+    size = max(1, entries / num_topics)
+
+    start = 0
+    D = len(offsets) - 1
+    while start < D:
+        # as many documents as fit, but always at least one
+        end = np.searchsorted(offsets, offsets[start] + size, side='right') - 1
+        end = min(max(end, start + 1), D)
+        yield (start, end)
+        start = end
+
+# everything about a batch of documents that doesn't change across
+# iterations of the E-step
+class Batch(object):
+    def __init__(self, data, start, end):
+        (lo,hi) = data.offsets[start], data.offsets[end]
+        self.start = start
+        self.end = end
+        self.words = np.asarray(data.terms[lo:hi], dtype=np.int64)
+        self.counts = np.asarray(data.counts[lo:hi], dtype=np.float64)
+
+        lengths = np.diff(data.offsets[start:end+1])
+        self.docs = np.repeat(np.arange(end - start), lengths)
+        self.num_docs = end - start
+
+        # sums entries by document
+        n = len(self.words)
+        self.by_doc = scipy.sparse.csr_matrix(
+            (np.ones(n), (self.docs, np.arange(n))), shape=(self.num_docs, n))
+        self.totals = self.by_doc.dot(self.counts)
+
+        # ... and by word
+        (self.vocab, inverse) = np.unique(self.words, return_inverse=True)
+        self.by_word = scipy.sparse.csr_matrix(
+            (np.ones(n), (inverse, np.arange(n))), shape=(len(self.vocab), n))
+
+def dirichlet_expectation(gamma):
+    return psi(gamma) - psi(gamma.sum(axis=1))[:,np.newaxis]
+
+# the variational bound for each document, given gamma and the phi that
+# is optimal for it (which makes the word terms collapse to log phinorm)
+def doc_likelihoods(batch, gamma, elog_theta, phinorm, alpha):
+    K = gamma.shape[1]
+    words = batch.by_doc.dot(batch.counts * np.log(phinorm))
+
+    return (gammaln(alpha * K) - K * gammaln(alpha) - gammaln(gamma.sum(axis=1))
+            + ((alpha - gamma) * elog_theta + gammaln(gamma)).sum(axis=1)
+            + words)
+
+# the E-step for one batch: returns gamma, the likelihood of each
+# document, E[log theta], and phi (one row per entry of the batch). as in
+# LDA-C, each document stops once it has converged, so what we get for it
+# doesn't depend on what else is in the batch
+def infer_batch(batch, exp_beta, alpha, var_max_iter, var_converged):
+    K = exp_beta.shape[0]
+    eb = exp_beta[:,batch.words].T
+
+    # the same starting point as LDA-C
+    gamma = alpha + np.repeat(batch.totals[:,np.newaxis] / K, K, axis=1)
+
+    likelihood_old = None
+    active = np.ones(batch.num_docs, dtype=bool)
+    i = 0
+    while True:
+        i += 1
+        elog_theta = dirichlet_expectation(gamma)
+        exp_theta = np.exp(elog_theta)
+        phinorm = np.einsum('nk,nk->n', exp_theta[batch.docs], eb) + 1e-100
+
+        likelihood = doc_likelihoods(batch, gamma, elog_theta, phinorm, alpha)
+        if likelihood_old is not None:
+            converged = np.abs((likelihood_old - likelihood) / likelihood_old)
+            active &= converged > var_converged
+        if not active.any() or (var_max_iter > 0 and i > var_max_iter):
+            break
+        likelihood_old = likelihood
+
+        # documents that have converged keep their gamma (and so everything
+        # worked out from it)
+        new = alpha + exp_theta * batch.by_doc.dot((batch.counts / phinorm)[:,np.newaxis] * eb)
+        gamma[active] = new[active]
+
+    phi = exp_theta[batch.docs] * eb / phinorm[:,np.newaxis]
+    return (gamma, likelihood, elog_theta, phi)
+
+# the E-step for a shard of the corpus, in this process or a worker:
+# everything the M-step needs from it. the corpus and exp(beta) are in
+# shared, below
+def e_step_shard(job):
+    (start, end, alpha, var_max_iter, var_converged) = job
+    batch = Batch(shared['data'], start, end)
+    (g, lik, elog_theta, phi) = infer_batch(batch, shared['exp_beta'], alpha,
+                                            var_max_iter, var_converged)
+
+    return (start, end, g, lik.sum(), elog_theta.sum(),
+            batch.vocab, batch.by_word.dot(batch.counts[:,np.newaxis] * phi))
+
+shared = {}
+
+def start_worker(data, beta, shape):
+    shared['data'] = data
+    shared['exp_beta'] = np.frombuffer(beta).reshape(shape)
+
+# a pool of processes to do the E-step, each on its own shards of the
+# corpus. they get the corpus when they fork, and exp(beta) through
+# shared memory, so all we send them each iteration is which shards to
+# do; they send back gamma and the sufficient statistics, and we do the
+# M-step.
+class Workers(object):
+    def __init__(self, data, K, V, jobs):
+        self.beta = multiprocessing.RawArray('d', K * V)
+        self.exp_beta = np.frombuffer(self.beta).reshape(K, V)
+        self.pool = multiprocessing.Pool(jobs, start_worker, (data, self.beta, (K, V)))
+
+        # a few shards per worker, so they all finish at about the same time
+        entries = int(np.ceil(float(len(data.terms)) * K / (4 * jobs)))
+        self.shards = list(batches(data.offsets, K, min(entries, batch_entries)))
+
+    def e_step(self, log_beta, alpha, var_max_iter, var_converged):
+        self.exp_beta[:] = np.exp(log_beta)
+        # in order, so the sums come out the same from run to run
+        return self.pool.imap(
+            e_step_shard, [(start, end, alpha, var_max_iter, var_converged)
+                           for (start,end) in self.shards])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+def e_step(data, log_beta, alpha, var_max_iter, var_converged, workers=None):
+    (K,V) = log_beta.shape
+
+    gamma = np.empty((len(data), K))
+    class_word = np.zeros((V, K))
+    alpha_ss = 0.0
+    likelihood = 0.0
+
+    if workers is None:
+        shared['data'] = data
+        shared['exp_beta'] = np.exp(log_beta)
+        results = (e_step_shard((start, end, alpha, var_max_iter, var_converged))
+                   for (start,end) in batches(data.offsets, K))
+    else:
+        results = workers.e_step(log_beta, alpha, var_max_iter, var_converged)
+
+    for (start, end, g, lik, ss, vocab, counts) in results:
+        gamma[start:end] = g
+        likelihood += lik
+        alpha_ss += ss
+        class_word[vocab] += counts
+
+    return (gamma, likelihood, class_word.T, alpha_ss)
+
+def infer(data, log_beta, alpha, var_max_iter, var_converged):
+    K = log_beta.shape[0]
+    exp_beta = np.exp(log_beta)
+
+    gamma = np.empty((len(data), K))
+    likelihood = np.empty(len(data))
+    topics = np.empty(len(data.terms), dtype=np.int64)
+
+    for (start,end) in batches(data.offsets, K):
+        batch = Batch(data, start, end)
+        (g, lik, elog_theta, phi) = infer_batch(batch, exp_beta, alpha, var_max_iter, var_converged)
+
+        gamma[start:end] = g
+        likelihood[start:end] = lik
+        topics[data.offsets[start]:data.offsets[end]] = phi.argmax(axis=1)
+
+    return (gamma, likelihood, topics)
+
+def d_alhood(a, ss, D, K):
+    return D * (K * psi(K * a) - K * psi(a)) + ss
+
+def d2_alhood(a, D, K):
+    return D * (K * K * polygamma(1, K * a) - K * polygamma(1, a))
+
+# newton's method on log alpha, exactly as LDA-C does it
+def opt_alpha(ss, D, K):
+    init_a = 100.0
+    log_a = np.log(init_a)
+
+    i = 0
+    while True:
+        i += 1
+        a = np.exp(log_a)
+        if np.isnan(a):
+            init_a = init_a * 10
+            print "warning : alpha is nan; new init = %5.5f" % init_a
+            a = init_a
+            log_a = np.log(a)
+
+        df = d_alhood(a, ss, D, K)
+        d2f = d2_alhood(a, D, K)
+        log_a = log_a - df / (d2f * a + df)
+
+        if abs(df) <= NEWTON_THRESH or i >= MAX_ALPHA_ITER:
+            return np.exp(log_a)
+
+def mle(class_word):
+    class_total = class_word.sum(axis=1)[:,np.newaxis]
+
+    with np.errstate(divide='ignore'):
+        log_beta = np.log(class_word) - np.log(class_total)
+    log_beta[class_word <= 0] = -100.0
+
+    return log_beta
+
+def initial_model(data, K, start, rng):
+    V = data.num_terms()
+
+    if start == "seeded":
+        class_word = np.zeros((K, V))
+        for k in range(K):
+            for i in range(NUM_INIT):
+                (words,counts) = data[int(np.floor(rng.random_sample() * len(data)))]
+                np.add.at(class_word[k], words, counts)
+        class_word += 1.0
+    elif start == "random":
+        class_word = 1.0 / V + rng.random_sample((K, V))
+    else:
+        # a saved model, e.g. PFX/lda50/final, which brings its own alpha
+        return ldac.read_model(start)
+
+    return (mle(class_word), None)
+
+def estimate(data, alpha, K, settings, start, d, seed=None, resume=False, jobs=1):
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    checkpoint.clear_stop(d)
+
+    var_max_iter = settings['var max iter']
+    estimate_alpha = settings['alpha'] == 'estimate'
+
+    saved = checkpoint.load(d) if resume else None
+    if saved is not None and saved['engine'] == 'vem':
+        # carry on from the last model we saved
+        i = saved['iteration']
+        prefix = os.path.join(d, "%03d" % i)
+        (log_beta, alpha) = ldac.read_model(prefix)
+        gamma = ldac.read_gamma(prefix + ".gamma")
+        (likelihood_old, converged) = (saved['likelihood'], saved['converged'])
+        var_max_iter = saved['var max iter']
+
+        print "resuming from iteration %d" % i
+        checkpoint.truncate_likelihoods(d, i)
+        likelihood_file = open(os.path.join(d, "likelihood.dat"), "a")
+    else:
+        rng = np.random.RandomState(seed)
+        (log_beta, saved_alpha) = initial_model(data, K, start, rng)
+        if saved_alpha is not None:
+            alpha = saved_alpha
+        ldac.write_model(os.path.join(d, "000"), log_beta, alpha)
+
+        likelihood_file = open(os.path.join(d, "likelihood.dat"), "w")
+
+        i = 0
+        likelihood_old = 0.0
+        converged = 1.0
+
+    workers = Workers(data, K, log_beta.shape[1], jobs) if jobs > 1 else None
+
+    while (converged < 0 or converged > settings['em convergence'] or i <= 2) and \
+          i <= settings['em max iter']:
+        i += 1
+        print "**** em iteration %d ****" % i
+        began = time.time()
+
+        (gamma, likelihood, class_word, alpha_ss) = \
+            e_step(data, log_beta, alpha, var_max_iter, settings['var convergence'], workers)
+
+        log_beta = mle(class_word)
+        if estimate_alpha:
+            alpha = opt_alpha(alpha_ss, len(data), K)
+
+        if likelihood_old == 0.0:
+            converged = float('inf')
+        else:
+            converged = (likelihood_old - likelihood) / likelihood_old
+        if converged < 0:
+            var_max_iter = var_max_iter * 2
+        likelihood_old = likelihood
+
+        likelihood_file.write(ldac.likelihood_line(likelihood, converged))
+        likelihood_file.flush()
+        print "likelihood %f (%.1fs)" % (likelihood, time.time() - began)
+
+        if i % LAG == 0:
+            prefix = os.path.join(d, "%03d" % i)
+            ldac.write_model(prefix, log_beta, alpha)
+            ldac.write_gamma(prefix + ".gamma", gamma)
+            checkpoint.save(d, engine='vem', iteration=i, likelihood=likelihood,
+                            converged=converged, **{'var max iter': var_max_iter})
+
+        if checkpoint.stop_requested(d):
+            print "stopping early: " + checkpoint.take_stop(d)
+            break
+
+    likelihood_file.close()
+    if workers is not None:
+        workers.close()
+
+    ldac.write_model(os.path.join(d, "final"), log_beta, alpha)
+    ldac.write_gamma(os.path.join(d, "final.gamma"), gamma)
+
+    # for visualization, like LDA-C
+    (_, _, topics) = infer(data, log_beta, alpha, var_max_iter, settings['var convergence'])
+    ldac.write_word_assignments(os.path.join(d, "word-assignments.dat"), data, topics)
+
+# like `lda inf`: writes NAME-gamma.dat and NAME-lda-lhood.dat
+def inference(settings, model, data, name):
+    (log_beta, alpha) = ldac.read_model(model)
+    (gamma, likelihood, _) = infer(data, log_beta, alpha,
+                                   settings['var max iter'], settings['var convergence'])
+
+    ldac.write_gamma(name + "-gamma.dat", gamma)
+    np.savetxt(name + "-lda-lhood.dat", likelihood, fmt='%5.5f')
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(
+        description = "variational EM for LDA, compatible with LDA-C")
+    sub = parser.add_subparsers(dest = 'mode')
+
+    est = sub.add_parser('est', help = "estimate a model, like `lda est`")
+    est.add_argument('--seed', type = int,
+                     help = "random seed (default: different every time)")
+    est.add_argument('--resume', action = 'store_true',
+                     help = "carry on from the last checkpoint in the directory, if there is one")
+    est.add_argument('-j', '--jobs', type = int, default = 1,
+                     help = "number of processes to do the E-step in (0 means one per core)")
+    est.add_argument('alpha')
+    est.add_argument('k', type = int)
+    est.add_argument('settings')
+    est.add_argument('data')
+    est.add_argument('start', help = "seeded, random, or a saved model (e.g. PFX/lda50/final)")
+    est.add_argument('directory')
+
+    inf = sub.add_parser('inf', help = "infer topics for new documents, like `lda inf`")
+    inf.add_argument('settings')
+    inf.add_argument('model')
+    inf.add_argument('data')
+    inf.add_argument('name')
+
+    args = parser.parse_args()
+
+    settings = ldac.read_settings(args.settings)
+    data = corpus.load(args.data)
+
+    if args.mode == 'est':
+        estimate(data, ldac.atof(args.alpha), args.k, settings, args.start, args.directory,
+                 args.seed, args.resume, args.jobs or multiprocessing.cpu_count())
+    else:
+        inference(settings, args.model, data, args.name)
@@ -2,10 +2,12 @@ import sys, os
 import pickle
 
 import nltk
+import numpy as np
 
 import paths
 
 from utils import *
+import store
 
 def words_to_dict(words):
     return dict(zip(words, range(0, len(words))))
@@ -19,6 +21,9 @@ if use_wordnet:
 else:
     stemmer = nltk.stem.porter.PorterStemmer()
     stem = stemmer.stem
+
+lemma_file = "lemmas.pickle"
+lemmas = LemmaCache(stem, name=type(stemmer).__name__)
     
 def tokens(text):
     replacements = [("---"," "),
@@ -30,6 +35,15 @@ def tokens(text):
     
     return preprocess(text)
 
+# distances from every row of gammas to tgt at once, as in utils
+def distances(gammas, tgt):
+    return np.sqrt(((gammas - tgt) ** 2).sum(axis=1))
+
+def kl_divergences(gammas, tgt):
+    p = gammas / gammas.sum(axis=1)[:,np.newaxis]
+    q = tgt / tgt.sum()
+    return ((p - q) * (np.log(p) - np.log(q))).sum(axis=1)
+
 def make_bow(doc,d):
     bow = {}
     
@@ -85,11 +99,17 @@ if __name__ == '__main__':
     pdf_file = args[0]
     (base,_) = os.path.splitext(pdf_file)
     
-    text = os.popen("/usr/bin/pdftotext \"%s\" -" % pdf_file).read() # XXX safe filenames!
+    text = pdf_to_text(pdf_file, timeout=60, pdftotext="/usr/bin/pdftotext")
+    if text is None:
+        print >>sys.stderr, "pdftotext couldn't read " + pdf_file
+        text = ""
 
     vocab = words_to_dict(open(words).read().split())
     
-    bow = make_bow(map(stem,tokens(text)),vocab)
+    lemmas.load(lemma_file)
+    bow = make_bow(map(lemmas,tokens(text)),vocab)
+    lemmas.save(lemma_file)
+    print >>sys.stderr, lemmas.stats()
 
     dat_file = base + ".dat"
     out = open(dat_file,"w")
@@ -108,26 +128,26 @@ if __name__ == '__main__':
     # XXX capture output, handle errors
     inf = read(base + "-gamma.dat")
     
-    gammas = read(model + ".gamma")
-    papers = zip(read(docs), map(lambda s: map(float,s.split()), gammas))
+    gammas = np.asarray(store.load_gamma(model), dtype=np.float64)
+    titles = read(docs)
 
     tgt = ["INPUT PDF"] + map(lambda s: map(float,s.split()), inf)
     # XXX these are the topic values, if we want to visualize them
     # XXX be careful to not leak our filenames
 
     if dfun == "euclidean":
-        metric = distance
+        metric = distances
         fmt = '%d'
     elif dfun == "kl":
-        metric = kl_divergence
+        metric = kl_divergences
         fmt = '%f'
     else:
-        metric = kl_divergence
+        metric = kl_divergences
         fmt = '%f'
     
-    papers = map(lambda s: (metric(s[1],tgt[1]),s), papers)
-    papers.sort(lambda x,y: cmp(x[0],y[0]))
+    scores = metric(gammas, np.array(tgt[1]))
+    papers = np.argsort(scores, kind='mergesort')
 
     print "\nRelated papers:\n"
-    for (d,(doc,gs)) in papers[0:num]:
-        print ('  %s (' + fmt + ')') % (doc,d)   
+    for p in papers[0:num]:
+        print ('  %s (' + fmt + ')') % (titles[p],scores[p])   
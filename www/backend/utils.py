@@ -4,6 +4,11 @@ import sys
 import os
 import math
 import unicodedata
+import pickle
+import tempfile
+import subprocess
+import threading
+import signal
 
 def mean(l):
     return sum(l) / float(len(l))
@@ -47,6 +52,110 @@ def to_csv(f,l):
 def quote(s):
     return '"' + s.replace('\\', '\\\\').replace('"','\\"') + '"'
 
+# memoizes a lemmatizer (or stemmer) by surface token. the table is
+# bounded: once it's full, new tokens are lemmatized but not remembered.
+# it can be saved after a run and loaded at the start of the next one.
+class LemmaCache(object):
+    def __init__(self, lemmatize, name="", size=1000000):
+        self.lemmatize = lemmatize
+        self.name = name
+        self.size = size
+        self.lemmas = {}
+        self.learned = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, word):
+        lemma = self.lemmas.get(word)
+        if lemma is not None:
+            self.hits += 1
+            return lemma
+
+        self.misses += 1
+        lemma = self.lemmatize(word)
+        self.remember(word, lemma)
+        return lemma
+
+    def remember(self, word, lemma):
+        if len(self.lemmas) < self.size and word not in self.lemmas:
+            self.lemmas[word] = lemma
+            self.learned[word] = lemma
+
+    # what we've learned since the last drain, e.g., in a worker process
+    def drain(self):
+        learned = (self.learned, self.hits, self.misses)
+        self.learned = {}
+        self.hits = 0
+        self.misses = 0
+        return learned
+
+    def absorb(self, learned):
+        lemmas, hits, misses = learned
+        for word in lemmas:
+            self.remember(word, lemmas[word])
+        self.hits += hits
+        self.misses += misses
+
+    def load(self, f):
+        if not os.path.exists(f):
+            return
+
+        saved = pickle.load(open(f, "rb"))
+        if saved.get('name') != self.name:
+            # made by some other lemmatizer
+            return
+
+        for word, lemma in saved['lemmas'].iteritems():
+            if len(self.lemmas) >= self.size:
+                break
+            self.lemmas[word] = lemma
+
+    def save(self, f):
+        if not self.learned:
+            return
+
+        # write and rename, so concurrent runs never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(f)))
+        out = os.fdopen(fd, "wb")
+        pickle.dump({'name': self.name, 'lemmas': self.lemmas}, out, pickle.HIGHEST_PROTOCOL)
+        out.close()
+        os.rename(tmp, f)
+        self.learned = {}
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return "Lemma cache: %d hits, %d misses (%.1f%% hit rate), %d entries" % \
+            (self.hits, self.misses, rate, len(self.lemmas))
+
+# runs pdftotext on a PDF, giving up after timeout seconds; returns None
+# if pdftotext fails or runs out of time
+def pdf_to_text(pdf_file, timeout=120, pdftotext="pdftotext"):
+    try:
+        # in its own process group, so we can kill anything it starts
+        p = subprocess.Popen([pdftotext, pdf_file, "-"],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             preexec_fn=os.setsid)
+    except OSError:
+        return None
+
+    def kill():
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            pass # it finished just in time
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        text, _ = p.communicate()
+    finally:
+        timer.cancel()
+
+    if p.returncode != 0:
+        return None
+    return text
+
 # the following definitions are taken from gensim.utils
 # see https://github.com/piskvorky/gensim/blob/develop/gensim/utils.py
 